@@ -1,63 +1,237 @@
 
+import asyncio
 import random
 import re
-import string
-import nltk
+import json
+import hashlib
+import functools
+import threading
+from collections import namedtuple
+from pathlib import Path
 from spellchecker import SpellChecker
 import datetime
 
 try:
     # Case 1: imported as a package: from WeatherBot.WeatherBot import WeatherAPI
-    from WeatherBot.config import KNOWN_CITIES
+    from WeatherBot import config
+    from WeatherBot.CityIndex import CityIndex
+    from WeatherBot.IntentMatcher import IntentMatcher
+    from WeatherBot.Metrics import METRICS
+    from WeatherBot.SpellEngine import SpellEngine
+    from WeatherBot.Utterance import Utterance, normalize_text
     from WeatherBot.WeatherAPI import WeatherAPI
 except ImportError:
     # Case 2: run from inside WeatherBot/ as a plain script
-    from config import KNOWN_CITIES
+    import config
+    from CityIndex import CityIndex
+    from IntentMatcher import IntentMatcher
+    from Metrics import METRICS
+    from SpellEngine import SpellEngine
+    from Utterance import Utterance, normalize_text
     from WeatherAPI import WeatherAPI
 
-class Chatbot:
-    def __init__(self):
-        self.keywords = {
-            "greetings": ["hello", "hi", "hey", "howdy", "hullo"],
-            "feeling": ["how are you", "how is it going", "how do you do"],
-            "goodbye": ["bye", "goodbye", "see you", "later"],
-            "weather": ["weather", "rain", "sunny", "forecast", 'sunrise', 'sunset', 'temperature', 'temp', 'wind', 'weather', 'rain', 'windy', 'hot', 'cold', 'freezing', 'chilly', 'warm', 'humid'],
-            "time": ["time", "hour", "clock"],
-            "name": ["your name", "who are you"],
-            "thanks": ["thank", "thanks", "thank you", "ty"],
-            "rude": ["rude", "mean", "stupid", "idiot", "dumb" ]
-        }
-        self.responses = {
-            "greetings": ["Hello!", "Hey there!", "Hi! How can I help you?"],
-            "feeling": ["I'm just a bot, but thanks for asking!", "Doing great, how about you?"],
-            "goodbye": ["Hasta la vista baby!", "Ciao"],
-            "time": ["We said a weather bot, this is not a time bot, check your watch!", "Time is an illusion."],
-            "name": ["You really want me to be your friend huh ? I am just a robot... Sorry you are so lonely.",],
-            "thanks": ["You're welcome!", "No problem!", "Glad I could help!"],
-            "rude": ["You are the rude own here"],
-            "unknown": ["wtf are you saying ?"]
-        }
-        self.weather_api = WeatherAPI()
+TODAY_KEYWORDS = ["today", "now", "tonight", "thisday"]
+TOMORROW_KEYWORDS = ["tomorrow", "nextday"]
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+ACCEPTED_KEYWORDS = ['sunrise', 'sunset', 'temperature', 'temp', 'wind', 'rain', 'windy']
+# how a position is named when there is no gazetteer to find the nearest city in
+HERE = "your location"
+# misspelt city lookups per message, the words are tried in message order
+MAX_FUZZY_LOOKUPS = 12
+# a city right after these is a place, whatever its name: "in nice", "for orange"
+PLACE_WORDS = ("in", "for")
+# and so is a city listed after one: "in Paris and nice"
+LIST_WORDS = ("and", "or")
+
+# A city found in a message. plain: one dictionary word ("nice", "tours"); capital: typed
+# with a capital, not as the first word for a plain one; context: after PLACE_WORDS or listed
+CityMention = namedtuple("CityMention", "city plain capital context")
+
+# Day ranges, all capped to the forecast window
+FORECAST_DAYS = 7
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "few": 3, "couple": 2}
+DAY_RANGE_RE = re.compile(r"\b(\d+|" + "|".join(NUMBER_WORDS) + r")(?: of)? days\b")
+WEEK_RE = re.compile(r"\b(?:this|next|coming|whole) week\b")
+WEEKEND_RE = re.compile(r"\bweekend\b")
+
+# Times of day, as [start, end) hours of the day
+TIME_OF_DAY = {
+    "morning": (6, 12),
+    "noon": (12, 13),
+    "midday": (12, 13),
+    "afternoon": (12, 18),
+    "evening": (18, 22),
+    "tonight": (18, 24),
+    "night": (18, 24),
+    "midnight": (0, 1),
+}
+TIME_OF_DAY_RE = re.compile(r"\b(" + "|".join(TIME_OF_DAY) + r")\b")
+# a time of day alone ("good night") is no follow-up, it has to be asked: "and tonight?", "what about the evening?"
+TIME_FOLLOW_UP_RE = re.compile(r"\b(?:and|about)(?: in)?(?: the| this)? (?:" + "|".join(TIME_OF_DAY) + r")\b")
+# "5pm", "5:30 pm", "17:00", "17h", "17h30"
+CLOCK_RE = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*([ap])\.?m\b|\b(\d{1,2}):(\d{2})\b|\b(\d{1,2})h(?:(\d{2}))?\b")
+
+
+# Hours of the clock times in a lowercase message, in order
+def clock_hours(text):
+    hours = []
+    for m in CLOCK_RE.finditer(text):
+        if m.group(3):
+            hour = int(m.group(1)) % 12 + (12 if m.group(3) == "p" else 0)
+        else:
+            hour = int(m.group(4) or m.group(6))
+        if hour < 24:
+            hours.append(hour)
+    return hours
+
+# Intents in priority order with their hand written keywords, expanded with WordNet synonyms
+BASE_KEYWORDS = {
+    "greetings": ["hello", "hi", "hey", "howdy", "hullo"],
+    "feeling": ["how are you", "how is it going", "how do you do"],
+    "goodbye": ["bye", "goodbye", "see you", "later"],
+    "weather": ["weather", "rain", "sunny", "forecast", 'sunrise', 'sunset', 'temperature', 'temp', 'wind', 'weather', 'rain', 'windy', 'hot', 'cold', 'freezing', 'chilly', 'warm', 'humid'],
+    "time": ["time", "hour", "clock"],
+    "name": ["your name", "who are you"],
+    "thanks": ["thank", "thanks", "thank you", "ty"],
+    "rude": ["rude", "mean", "stupid", "idiot", "dumb" ]
+}
+
+RESPONSES = {
+    "greetings": ["Hello!", "Hey there!", "Hi! How can I help you?"],
+    "feeling": ["I'm just a bot, but thanks for asking!", "Doing great, how about you?"],
+    "goodbye": ["Hasta la vista baby!", "Ciao"],
+    "time": ["We said a weather bot, this is not a time bot, check your watch!", "Time is an illusion."],
+    "name": ["You really want me to be your friend huh ? I am just a robot... Sorry you are so lonely.",],
+    "thanks": ["You're welcome!", "No problem!", "Glad I could help!"],
+    "rude": ["You are the rude own here"],
+    "unknown": ["wtf are you saying ?"]
+}
+
+# Precomputed expansion of BASE_KEYWORDS, shipped with the code; regenerate with `python build_keywords.py`
+# whenever BASE_KEYWORDS changes, a stale file is ignored and WordNet is loaded instead
+KEYWORDS_FILE = Path(__file__).resolve().parent / "keywords.json"
+KEYWORDS_VERSION = 1
+
+
+# Fingerprint of the base keywords, a stale keywords file is ignored
+def keywords_source_hash(keywords=BASE_KEYWORDS):
+    return hashlib.sha256(json.dumps(keywords, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Index over a city list given by the caller, kept for the next call with the same list
+@functools.lru_cache(maxsize=8)
+def _list_index(cities):
+    return CityIndex(cities)
+
+
+# Shared index for None or config.KNOWN_CITIES, the index itself when given one
+def city_index(known_cities=None):
+    if known_cities is None:
+        return config.CITY_INDEX
+    if isinstance(known_cities, CityIndex):
+        return known_cities
+    if known_cities is config.KNOWN_CITIES:
+        return config.CITY_INDEX
+    return _list_index(tuple(known_cities))
+
+
+# Load the expanded keywords, None when the file is missing or out of date
+def load_keywords(path=KEYWORDS_FILE):
+    if path is None:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != KEYWORDS_VERSION or data.get("source_hash") != keywords_source_hash():
+        return None
+    # json keeps key order, so intent priority survives the round trip
+    return data["keywords"]
+
+
+def save_keywords(keywords, path=KEYWORDS_FILE):
+    data = {
+        "version": KEYWORDS_VERSION,
+        "source_hash": keywords_source_hash(),
+        "keywords": {intent: sorted(kw_list) for intent, kw_list in keywords.items()},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+
+
+# WordNet is only needed to (re)build the keyword expansion, so nltk is imported lazily
+@functools.lru_cache(maxsize=None)
+def _wordnet():
+    import nltk
+
+    try:
+        nltk.corpus.wordnet.ensure_loaded()
+    except LookupError:
+        nltk.download('wordnet')
+        nltk.download('omw-1.4')
+    return nltk.corpus.wordnet
+
+
+class ChatResources:
+    """Everything a Chatbot needs that does not depend on the conversation.
+
+    Keyword lists, intent matcher, spell engine and the weather API client
+    are built once per process and only read afterwards, so every session
+    shares the same instance (see `shared`).
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, keywords_path=KEYWORDS_FILE, weather_api=None):
+        self.responses = RESPONSES
+        self.weather_api = weather_api or WeatherAPI(
+            store_path=config.WEATHER_STORE_PATH,
+            pool_size=10,
+            transport=config.WEATHER_TRANSPORT,
+            stale_ttl=config.FORECAST_STALE_TTL,
+            prefetch_top=config.PREFETCH_TOP,
+        )
 
 		# building regex patterns
-            # First let's add a bunch of synonyms to our keywords and expand the list
-        self.complete_keywords_dict(self.keywords)
+            # First let's add a bunch of synonyms to our keywords and expand the list,
+            # from the prebuilt file when it is there, from WordNet otherwise
+        self.keywords = load_keywords(keywords_path)
+        if self.keywords is None:
+            self.complete_keywords_dict(BASE_KEYWORDS)
         self.patterns = self.build_patterns_dict(self.keywords)
+        # one trie for all intents, used instead of trying each regex in turn
+        self.intent_matcher = IntentMatcher(self.keywords)
 
-        # define spellchecker
+        # define spellchecker: pyspellchecker only tells which English words to leave alone,
+        # corrections come from a deletion index over the words the bot understands
         self.spell = SpellChecker()
+        self.spell_engine = self.build_spell_engine(self.keywords)
+        # words the bot understands, never taken for a misspelt city
+        self.vocabulary = self.build_vocabulary(self.keywords)
+
+    # Process wide instance, built by the first caller
+    @classmethod
+    def shared(cls):
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+
+    # Build now what is otherwise built on first use, so no chat waits for it and workers
+    # forked afterwards share it: the typo tolerant city lookup, the local geocoding table
+    # and, when clients send positions, the nearest city search
+    def preload(self, geocoding=True, positions=False):
+        config.preload("CITY_RESOLVER", *(["CITY_LOCATOR"] if positions else []))
+        if geocoding:
+            self.weather_api.preload()
 
-    # normalization
-    def normalize(self, text: str) -> str:
-        # Lowercase, remove punctuation, strip whitespace
-        text = text.lower()
-        text = text.translate(str.maketrans("", "", string.punctuation))
-        return text.strip()
-    
     # find synonym for a given word
     def get_synonyms(self, word):
         synonyms = set()
-        for syn in nltk.corpus.wordnet.synsets(word):
+        for syn in _wordnet().synsets(word):
             for lemma in syn.lemmas():
                 synonyms.add(lemma.name().lower())
         return synonyms
@@ -73,7 +247,7 @@ class Chatbot:
         for keyword in keywords_list:
             expanded_keywords.update(self.get_synonyms(keyword))
             # Also add the original keyword
-            expanded_keywords.add(self.normalize(keyword))
+            expanded_keywords.add(normalize_text(keyword))
         
         return expanded_keywords
 
@@ -104,27 +278,76 @@ class Chatbot:
             patterns[intent] = self.build_regex_pattern(kw_list)
         return patterns
 
+    # Domain vocabulary, most important words first: intents, dates, then cities by population
+    def build_spell_engine(self, keywords):
+        engine = SpellEngine(known=self.spell)
+        for kw_list in keywords.values():
+            engine.add_words(tok for kw in kw_list for tok in kw.split() if tok.isalpha())
+        engine.add_words([*TODAY_KEYWORDS, *TOMORROW_KEYWORDS, *WEEKDAYS, *ACCEPTED_KEYWORDS])
+        # city names are reachable from one typo only, keeping the index small
+        city_tokens = (tok for city in config.CITY_INDEX.cities for tok in normalize_text(city).split())
+        engine.add_words((tok for tok in city_tokens if len(tok) >= 4), max_distance=1)
+        return engine
+
+    def build_vocabulary(self, keywords):
+        words = {tok for kw_list in keywords.values() for kw in kw_list for tok in kw.split()}
+        words.update(TODAY_KEYWORDS, TOMORROW_KEYWORDS, WEEKDAYS, ACCEPTED_KEYWORDS)
+        return words
+
+
+
+class Chatbot:
+    """One conversation: shared read-only resources plus a little session state."""
+
+    def __init__(self, resources=None):
+        resources = resources or ChatResources.shared()
+        self.resources = resources
+        # plain references to the shared objects, nothing is copied per session
+        self.responses = resources.responses
+        self.weather_api = resources.weather_api
+        self.keywords = resources.keywords
+        self.patterns = resources.patterns
+        self.intent_matcher = resources.intent_matcher
+        self.spell = resources.spell
+        self.spell_engine = resources.spell_engine
+        self.vocabulary = resources.vocabulary
+
+        # conversation state, so "and tomorrow?" is about the city asked before
+        self.last_intent = None
+        self.last_cities = []
+        # positions sent by the client, under the name of the nearest city
+        self.locations = {}
+        self.follow_up = False
+        self.last_timings = {}
+
+    # normalization
+    def normalize(self, text: str) -> str:
+        return normalize_text(text)
+
     # Spellchecker
     def correct_spelling(self, word):
-        corrected_word = self.spell.candidates(word)
-        if corrected_word:
-            return list(corrected_word)[0]
-        return word
+        return self.spell_engine.correct(word)
+
+    # Tokenized, normalized message shared by every stage of a turn; an Utterance is passed through
+    def parse(self, user_input):
+        if isinstance(user_input, Utterance):
+            return user_input
+        with METRICS.span("normalize"):
+            return Utterance(user_input, self.correct_spelling)
     
     # find intent from user message
     def match_patterns(self, user_message):
-        # extract words
-        words = user_message.split()
+        utterance = self.parse(user_message)
 
-        # Normalize words
-        normalized_words = [self.normalize(w) for w in words]
-        
         # correct spelling
-        corrected_words = [self.correct_spelling(w) for w in normalized_words]
+        with METRICS.span("spell_correction"):
+            corrected_message = utterance.corrected_text
 
-        # Normalize words
-        corrected_message = " ".join(corrected_words)
+        with METRICS.span("intent_match"):
+            return self.intent_matcher.match(corrected_message)
 
+    # Previous regex based matcher, kept as the reference for benchmarks
+    def match_patterns_regex(self, corrected_message):
         for intent, pattern in self.patterns.items():
             if re.match(pattern, corrected_message, re.IGNORECASE):
                 return intent
@@ -137,46 +360,141 @@ class Chatbot:
         else:
             return random.choice(responses_dict["unknown"])
     
-    # extract cities 
-    def extract_cities(self, user_input, known_cities):
-        user_input = user_input.lower()
-        user_input = user_input.translate(str.maketrans("", "", string.punctuation))
-        user_input = user_input.replace("-", " ").replace(' ', '')
-        for city in known_cities:
-            city_normalized = city.lower().replace(" ", "")
-            if city_normalized in user_input:
-                return city
-        return None
+    # extract cities: longest mention wins, then the most populous;
+    # with the default index a misspelt city ("Pariss") is looked up fuzzily
+    def extract_cities(self, user_input, known_cities=None):
+        utterance = self.parse(user_input)
+        if known_cities is not None:
+            return city_index(known_cities).best_compact(utterance.compact)
+        return config.CITY_INDEX.best_compact(utterance.compact) or self.resolve_misspelt_city(utterance)
+
+    # Closest city to a word, or two adjacent words, that the bot does not know otherwise
+    def resolve_misspelt_city(self, user_input):
+        utterance = self.parse(user_input)
+        words = utterance.words
+        unknown = [
+            w.isalpha() and w not in self.spell_engine and corrected not in self.vocabulary
+            for w, corrected in zip(words, utterance.corrected)
+        ]
+        # each unknown word, then it joined with the next one ("saint etiene")
+        spans = []
+        for i, word in enumerate(words):
+            if unknown[i]:
+                spans.append(word)
+            if i + 1 < len(words) and (unknown[i] or unknown[i + 1]):
+                spans.append(word + words[i + 1])
+        spans = [span for span in spans if len(span) >= 4 and span.isalpha()][:MAX_FUZZY_LOOKUPS]
+        best = None
+        with METRICS.span("city_fuzzy"):
+            for span in spans:
+                found = config.CITY_RESOLVER.candidates(span, limit=1)
+                # fewest edits, then the longer span: "new yrok" is New York, not York
+                if found and (best is None or (found[0][1], -len(span)) < best[0]):
+                    best = ((found[0][1], -len(span)), found[0][0])
+        return best[1] if best else None
     
     # extract date
     def extract_date(self, user_input):
-        user_input = user_input.lower()
-        user_input = user_input.translate(str.maketrans("", "", string.punctuation))
-        user_input = user_input.replace("-", " ").replace(' ', '')
-        today_keywords = ["today", "now", "tonight", "thisday"]
-        tomorrow_keywords = ["tomorrow", "nextday"]
-        weekdays = [
-            "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"
-        ]
-        if any(kw in user_input for kw in today_keywords):
+        user_input = self.parse(user_input).compact
+        if any(kw in user_input for kw in TODAY_KEYWORDS):
             return "today"
-        elif any(kw in user_input for kw in tomorrow_keywords):
+        elif any(kw in user_input for kw in TOMORROW_KEYWORDS):
             return "tomorrow"
         else:
-            for day in weekdays:
+            for day in WEEKDAYS:
                 if day in user_input:
                     return day
         return None
     
+    # extract every city mentioned, in message order; a dictionary word ("is it nice in
+    # Paris") is dropped when another city is clearly named as a place
+    def extract_all_cities(self, user_input, known_cities=None):
+        utterance = self.parse(user_input)
+        index = city_index(known_cities)
+        mentions = self.city_mentions(utterance, index)
+        places = [m.city for m in mentions if m.context or m.capital or not m.plain]
+        cities = list(dict.fromkeys(places or [m.city for m in mentions]))
+        if not cities:
+            # fall back on the looser single-city scan, then on typo tolerance with the default index
+            city = index.best_compact(utterance.compact)
+            if city is None and known_cities is None:
+                city = self.resolve_misspelt_city(utterance)
+            cities = [city] if city else []
+        return cities
+
+    # Whole word city mentions of a message, in order, with what tells a place from a word
+    def city_mentions(self, user_input, known_cities=None):
+        utterance = self.parse(user_input)
+        index = city_index(known_cities)
+        tokens, typed = utterance.tokens, utterance.typed_tokens
+        first = {start: i for i, (start, _) in enumerate(utterance.offsets)}
+        last = {end: i for i, (_, end) in enumerate(utterance.offsets)}
+        mentions = []
+        # last word of each mention that reads as a place, so a list goes on from it
+        place_ends = set()
+        for start, end, city in index.mention_spans(utterance.compact, utterance.offsets):
+            i, j = first[start], last[end]
+            plain = i == j and tokens[i] in self.spell
+            capital = typed[i][:1].isupper() and (i > 0 or not plain)
+            before = tokens[i - 1] if i else None
+            context = before in PLACE_WORDS or (before in LIST_WORDS and i - 2 in place_ends)
+            if context or capital or not plain:
+                place_ends.add(j)
+            mentions.append(CityMention(city, plain, capital, context))
+        return mentions
+
+    # extract every day asked about: day keywords in message order, or a range
+    # ("this weekend", "next 3 days") as ISO dates; empty when none is given
+    def extract_dates(self, user_input):
+        utterance = self.parse(user_input)
+        text = utterance.normalized
+        today = datetime.date.today()
+
+        m = DAY_RANGE_RE.search(text)
+        if m:
+            count = m.group(1)
+            count = int(count) if count.isdigit() else NUMBER_WORDS[count]
+            count = max(1, min(count, FORECAST_DAYS))
+            return [(today + datetime.timedelta(days=i)).isoformat() for i in range(count)]
+        if WEEK_RE.search(text):
+            return [(today + datetime.timedelta(days=i)).isoformat() for i in range(FORECAST_DAYS)]
+        if WEEKEND_RE.search(text):
+            # on a Sunday, what is left of the weekend is today
+            return ["sunday"] if today.weekday() == 6 else ["saturday", "sunday"]
+
+        tokens = utterance.words
+        # "this day" / "next day" are keywords too
+        words = tokens + [a + b for a, b in zip(tokens, tokens[1:])]
+        found = {}
+        for pos, word in enumerate(words):
+            if word in TODAY_KEYWORDS:
+                day = "today"
+            elif word in TOMORROW_KEYWORDS:
+                day = "tomorrow"
+            elif word in WEEKDAYS:
+                day = word
+            else:
+                continue
+            found.setdefault(day, pos if pos < len(tokens) else pos - len(tokens))
+        return sorted(found, key=found.get)
+
+    # extract the hours asked about: a clock time ("at 5pm" is 17 to 18), a span
+    # between two of them ("2pm to 5pm" is 14 to 17), or a time of day ("this afternoon"); None when not given
+    def extract_time(self, user_input):
+        # clock times need their punctuation, "5:30" or "5 p.m."
+        text = self.parse(user_input).lower
+        hours = clock_hours(text)
+        if len(hours) >= 2 and hours[0] < hours[-1]:
+            return hours[0], hours[-1]
+        if hours:
+            return hours[0], hours[0] + 1
+        m = TIME_OF_DAY_RE.search(text)
+        return TIME_OF_DAY[m.group(1)] if m else None
+
     # extract keywords
     def extract_keywords(self, user_input):
-        accepted = [
-            'sunrise', 'sunset', 'temperature', 'temp', 'wind', 'rain', 'windy'
-        ]
-        user_input = user_input.lower()
-        user_input = user_input.translate(str.maketrans("", "", string.punctuation))
-        words = user_input.split()
-        keywords = [w for w in words if w in accepted]
+        words = self.parse(user_input).words
+        keywords = [w for w in words if w in ACCEPTED_KEYWORDS]
         return keywords
     
     # temperature mood
@@ -216,72 +534,210 @@ class Chatbot:
         dt = datetime.datetime.fromisoformat(iso_time)
         return dt.strftime("%I:%M %p").lstrip("0")
 
-    def chat(self, user_input):
-        intent = self.match_patterns(user_input)
-        if intent == "weather":
-            # We use our own entity extraction, more robust than generic regex
-            city = self.extract_cities(user_input, KNOWN_CITIES)
-            time_keyword = self.extract_date(user_input)
-            additional_keyword = self.extract_keywords(user_input)  # ['sunrise'], ['temp']
-
-
-            weather_info = self.weather_api.get_weather(city, time_keyword)
-
-            if "error" in weather_info:
-                response = weather_info["error"]
-                return response, intent
-
-            # Common pieces
-            t_min = weather_info["temp_min"]
-            t_max = weather_info["temp_max"]
-            mood_text, mood_emoji = self._temperature_mood(t_min, t_max)
-
-            response = None 
-
-            # If the user asked for something specific (sunrise, temp, wind, rain...)
-            if additional_keyword:
-                for w in additional_keyword:
-                    w_low = w.lower()
-                    if w_low in ["sunrise", "sunset"]:
-                        response = (
-                            f"The {w_low} in {weather_info['city']} on {self._human_date(weather_info['date'])} "
-                            f"is at {self.human_time(weather_info[w_low])} {mood_emoji}"
-                        )
-                        break
-                    elif w_low in ["temperature", "temp"]:
-                        response = (
-                            f"In {weather_info['city']} on {self._human_date(weather_info['date'])}, "
-                            f"temperatures go from {t_min}°C to {t_max}°C. "
-                            f"{mood_text} {mood_emoji}"
-                        )
-                        break
-                    elif w_low == "wind" or w_low == "windy":
-                        response = (
-                            f"On {self._human_date(weather_info['date'])} in {weather_info['city']}, "
-                            f"the maximum wind speed is {weather_info['daily_wind']} km/h. "
-                            f"Better hold your hat! 💨🧢"
-                        )
-                        break
-                    elif w_low == "rain":
-                        response = (
-                            f"The weather in {weather_info['city']} on {self._human_date(weather_info['date'])} is "
-                            f"{weather_info['description'].lower()}. "
-                            f"Maybe keep an umbrella nearby, just in case. we never know... ☔"
-                        )
-                        break
-
-            # If no specific keyword matched, fall back to a general summary
-            if response is None:
-                response = (
-                    f"Here's the weather for {weather_info['city']} on {self._human_date(weather_info['date'])}: "
-                    f"{weather_info['description'].lower()}. "
-                    f"Temperatures between {t_min}°C and {t_max}°C. "
-                    f"Wind up to {weather_info['daily_wind']} km/h. "
-                    f"{mood_text} {mood_emoji}"
-                )
+    # We use our own entity extraction, more robust than generic regex
+    # coords: (lat, lon) of the user, used when the message names no city ("weather here")
+    def extract_weather_query(self, user_input, coords=None):
+        utterance = self.parse(user_input)
+        with METRICS.span("city_extraction"):
+            cities = self.extract_all_cities(utterance)
+        # only the cities named in the message are counted for prefetching: a follow-up was counted
+        # when first asked, and a position's forecast is cached under its own coordinates
+        if cities and self.weather_api.prefetcher is not None:
+            self.weather_api.prefetcher.record(cities)
+        if not cities and self.follow_up:
+            # "and tomorrow?": keep talking about the previous cities
+            cities = self.last_cities
+        if not cities and coords is not None:
+            city = self.locate(*coords)
+            self.locations[city] = tuple(coords)
+            cities = [city]
+        self.last_cities = cities
+        with METRICS.span("date_extraction"):
+            days = self.extract_dates(utterance)
+        additional_keyword = self.extract_keywords(utterance)  # ['sunrise'], ['temp']
+        hours = self.extract_time(utterance)  # (17, 18) for "at 5pm"
+        # no city or day: one lookup, get_weather reports the missing city / uses today
+        return cities or [None], days or [None], additional_keyword, hours
+
+    # Answers for every (city, day) pair, city by city. All the forecasts come
+    # from one batched request, the 7 day payloads then serve the other days.
+    def get_weather_infos(self, cities, days, hours=None):
+        if len(cities) == 1 and len(days) == 1:
+            return [self.weather_api.get_weather(cities[0], days[0], hours, self.locations.get(cities[0]))]
+        by_day = [self.weather_api.get_weather_many(cities, day, hours, self.locations) for day in days]
+        return [infos[city] for city in cities for infos in by_day]
+
+    async def aget_weather_infos(self, cities, days, hours=None):
+        # identical forecast lookups are coalesced, so this is one request per city
+        return await asyncio.gather(*(
+            self.weather_api.aget_weather(city, day, hours, self.locations.get(city))
+            for city in cities for day in days
+        ))
+
+    # Name of the gazetteer city closest to a position; the forecast itself
+    # is for the exact position, so no geocoding request is made
+    def locate(self, lat, lon):
+        with METRICS.span("reverse_geocode"):
+            try:
+                found = config.CITY_LOCATOR.nearest(lat, lon)
+            except (OSError, ValueError):
+                # no gazetteer to search
+                found = None
+        return found[0].name if found else HERE
+
+    # Turn the weather API answer into a message
+    def format_weather(self, weather_info, additional_keyword):
+        if "error" in weather_info:
+            return weather_info["error"]
+
+        # Common pieces
+        t_min = weather_info["temp_min"]
+        t_max = weather_info["temp_max"]
+        mood_text, mood_emoji = self._temperature_mood(t_min, t_max)
+
+        response = None 
+
+        # A time of day was asked and the forecast has its hours; sunrise and sunset stay daily answers
+        if "hour_start" in weather_info and not {"sunrise", "sunset"} & {w.lower() for w in additional_keyword}:
+            response = self.format_hours(weather_info, additional_keyword)
+
+        # If the user asked for something specific (sunrise, temp, wind, rain...)
+        if additional_keyword and response is None:
+            for w in additional_keyword:
+                w_low = w.lower()
+                if w_low in ["sunrise", "sunset"]:
+                    response = (
+                        f"The {w_low} in {weather_info['city']} on {self._human_date(weather_info['date'])} "
+                        f"is at {self.human_time(weather_info[w_low])} {mood_emoji}"
+                    )
+                    break
+                elif w_low in ["temperature", "temp"]:
+                    response = (
+                        f"In {weather_info['city']} on {self._human_date(weather_info['date'])}, "
+                        f"temperatures go from {t_min}°C to {t_max}°C. "
+                        f"{mood_text} {mood_emoji}"
+                    )
+                    break
+                elif w_low == "wind" or w_low == "windy":
+                    response = (
+                        f"On {self._human_date(weather_info['date'])} in {weather_info['city']}, "
+                        f"the maximum wind speed is {weather_info['daily_wind']} km/h. "
+                        f"Better hold your hat! 💨🧢"
+                    )
+                    break
+                elif w_low == "rain":
+                    response = (
+                        f"The weather in {weather_info['city']} on {self._human_date(weather_info['date'])} is "
+                        f"{weather_info['description'].lower()}. "
+                        f"Maybe keep an umbrella nearby, just in case. we never know... ☔"
+                    )
+                    break
+
+        # If no specific keyword matched, fall back to a general summary
+        if response is None:
+            response = (
+                f"Here's the weather for {weather_info['city']} on {self._human_date(weather_info['date'])}: "
+                f"{weather_info['description'].lower()}. "
+                f"Temperatures between {t_min}°C and {t_max}°C. "
+                f"Wind up to {weather_info['daily_wind']} km/h. "
+                f"{mood_text} {mood_emoji}"
+            )
 
+        return response
+
+    # Answer for a time window of the day, from the hourly forecast
+    def format_hours(self, weather_info, additional_keyword):
+        start = datetime.datetime.fromisoformat(weather_info["hour_start"])
+        end = datetime.datetime.fromisoformat(weather_info["hour_end"])
+        if end - start == datetime.timedelta(hours=1):
+            when = f"at {self.human_time(weather_info['hour_start'])}"
         else:
-            # Non-weather intents
-            response = self.get_message_from_intent(intent, self.responses)
+            when = f"between {self.human_time(weather_info['hour_start'])} and {self.human_time(weather_info['hour_end'])}"
+        place = f"in {weather_info['city']} on {self._human_date(weather_info['date'])} {when}"
+        t_min, t_max = weather_info["hourly_temp_min"], weather_info["hourly_temp_max"]
+        chance, amount = weather_info["precipitation_probability"], weather_info["precipitation"]
+        keywords = {w.lower() for w in additional_keyword or ()}
+
+        if "rain" in keywords and chance is not None:
+            umbrella = "Take an umbrella! ☔" if chance >= 50 or amount else "You should stay dry. 🌂"
+            return f"The chance of rain {place} is {chance}% ({amount} mm expected). {umbrella}"
+        if keywords & {"wind", "windy"} and weather_info["hourly_wind"] is not None:
+            return f"The wind {place} goes up to {weather_info['hourly_wind']} km/h. 💨"
+        if t_min is None:
+            return None
+
+        temps = f"{t_min}°C" if t_min == t_max else f"between {t_min}°C and {t_max}°C"
+        mood_text, mood_emoji = self._temperature_mood(t_min, t_max)
+        response = f"{place[0].upper()}{place[1:]}: {weather_info['hourly_description'].lower()}, {temps}. "
+        if chance:
+            response += f"{chance}% chance of rain. "
+        return response + f"{mood_text} {mood_emoji}"
+
+    # One message for all the answers, separated by blank lines
+    def format_weather_many(self, weather_infos, additional_keyword):
+        # the same error for every day of a range is said once
+        answers = dict.fromkeys(self.format_weather(info, additional_keyword) for info in weather_infos)
+        return "\n\n".join(answers)
+
+    # Intent of a message, reading a bare date or time right after a weather question as a follow-up
+    def detect_intent(self, user_input):
+        utterance = self.parse(user_input)
+        intent = self.match_patterns(utterance)
+        # "and in the morning?" can match a weather keyword itself, it still keeps the previous cities
+        self.follow_up = intent in ("unknown", "weather") and self.last_intent == "weather" and bool(
+            self.extract_dates(utterance) or clock_hours(utterance.lower)
+            or TIME_FOLLOW_UP_RE.search(utterance.normalized)
+        )
+        if self.follow_up or (intent == "unknown" and self.names_place_or_period(utterance)):
+            intent = "weather"
+        self.last_intent = intent
+        return intent
+
+    # A span of days or a named place is a weather question even without a weather word: "next 3 days
+    # in Lyon", "Saint-Étienne?". A city that is also a dictionary word only counts after "in"/"for",
+    # so "have a nice day" stays small talk; a typo alone never counts.
+    def names_place_or_period(self, user_input):
+        utterance = self.parse(user_input)
+        text = utterance.normalized
+        if DAY_RANGE_RE.search(text) or WEEK_RE.search(text) or WEEKEND_RE.search(text):
+            return True
+        return any(m.context or (m.capital and not m.plain) for m in self.city_mentions(utterance))
+
+    # coords: optional (lat, lon) of the user, e.g. from the browser, for "what's the weather here"
+    def chat(self, user_input, coords=None):
+        with METRICS.request() as timings, METRICS.span("chat"):
+            # parsed once, every stage below reads the same words
+            utterance = self.parse(user_input)
+            intent = self.detect_intent(utterance)
+            if intent == "weather":
+                cities, days, additional_keyword, hours = self.extract_weather_query(utterance, coords)
+                with METRICS.span("weather_api"):
+                    weather_infos = self.get_weather_infos(cities, days, hours)
+                response = self.format_weather_many(weather_infos, additional_keyword)
+            else:
+                # Non-weather intents
+                response = self.get_message_from_intent(intent, self.responses)
+
+        METRICS.inc("chat_requests_total", intent=intent)
+        # per stage seconds of this call, empty when metrics are off
+        self.last_timings = timings
+        return response, intent
+
+    # Same as chat, without blocking the event loop while the forecast is fetched;
+    # call resources.preload(positions=True) before serving, so no lookup table is built on the loop
+    async def achat(self, user_input, coords=None):
+        with METRICS.request() as timings, METRICS.span("chat"):
+            utterance = self.parse(user_input)
+            intent = self.detect_intent(utterance)
+            if intent == "weather":
+                cities, days, additional_keyword, hours = self.extract_weather_query(utterance, coords)
+                with METRICS.span("weather_api"):
+                    weather_infos = await self.aget_weather_infos(cities, days, hours)
+                response = self.format_weather_many(weather_infos, additional_keyword)
+            else:
+                # Non-weather intents
+                response = self.get_message_from_intent(intent, self.responses)
 
-        return response, intent
\ No newline at end of file
+        METRICS.inc("chat_requests_total", intent=intent)
+        self.last_timings = timings
+        return response, intent
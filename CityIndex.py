@@ -0,0 +1,144 @@
+import string
+from collections import deque
+
+# punctuation is dropped, then spaces, so "Saint-Étienne" and "saint etienne" share a key
+_STRIP_TABLE = str.maketrans("", "", string.punctuation + " ")
+# punctuation turned into spaces, to find where words start and end
+_SPLIT_TABLE = str.maketrans(string.punctuation, " " * len(string.punctuation))
+
+
+# Normalize a city name or a user message to the compact form used for matching
+def compact(text: str) -> str:
+    return text.lower().translate(_STRIP_TABLE)
+
+
+# Lowercase words of a message, split at spaces and punctuation; lower=False keeps them as typed
+def split_words(text: str, lower: bool = True) -> list:
+    return (text.lower() if lower else text).translate(_SPLIT_TABLE).split()
+
+
+# (start, end) of each word in the concatenation of the words
+def word_offsets(words) -> list:
+    offsets = []
+    pos = 0
+    for word in words:
+        offsets.append((pos, pos + len(word)))
+        pos += len(word)
+    return offsets
+
+
+class CityIndex:
+    """Aho-Corasick automaton over compacted city names.
+
+    Built once from a population-sorted city list: a lower rank means a more
+    populous city. Scanning a message costs one pass over its characters,
+    whatever the number of cities in the index.
+    """
+
+    def __init__(self, cities, ranks=None):
+        # node i: outgoing edges, failure link and the city ids ending here
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = {}
+        self.cities = []
+        self._ranks = []
+        self._lengths = []
+
+        for i, city in enumerate(cities):
+            key = compact(city)
+            if not key:
+                continue
+            rank = ranks[i] if ranks is not None else i
+            self._add(key, city, rank)
+        self._build_links()
+
+    def __len__(self):
+        return len(self.cities)
+
+    def _add(self, key, city, rank):
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+            node = nxt
+        city_id = len(self.cities)
+        self.cities.append(city)
+        self._ranks.append(rank)
+        self._lengths.append(len(key))
+        self._out[node] = self._out.get(node, ()) + (city_id,)
+
+    # Breadth first pass computing failure links, merging outputs along them
+    def _build_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                inherited = self._out.get(self._fail[child])
+                if inherited:
+                    self._out[child] = self._out.get(child, ()) + inherited
+
+    # Every (start, end, city_id) match in an already compacted text
+    def _scan(self, text):
+        goto, fail, out, lengths = self._goto, self._fail, self._out, self._lengths
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for city_id in out.get(node, ()):
+                yield pos + 1 - lengths[city_id], pos + 1, city_id
+
+    # All city mentions in a message, as (start, end, city) over its compact form
+    def find_all(self, text: str):
+        return [(start, end, self.cities[city_id]) for start, end, city_id in self._scan(compact(text))]
+
+    # Longest city mentioned in a message, the most populous one on ties
+    def best(self, text: str):
+        return self.best_compact(compact(text))
+
+    # Same, for a text already in compact form
+    def best_compact(self, key: str):
+        best_id = None
+        for _, _, city_id in self._scan(key):
+            if best_id is None or (-self._lengths[city_id], self._ranks[city_id]) < (
+                -self._lengths[best_id], self._ranks[best_id]
+            ):
+                best_id = city_id
+        return self.cities[best_id] if best_id is not None else None
+
+    # Every distinct city mentioned as whole words, in message order. Overlapping
+    # matches keep the leftmost, then the longest, then the most populous one.
+    def mentions(self, text: str):
+        tokens = split_words(text)
+        return self.mentions_compact("".join(tokens), word_offsets(tokens))
+
+    # Same, for the concatenated words of a message and the (start, end) of each word in it
+    def mentions_compact(self, key: str, offsets):
+        return list(dict.fromkeys(city for _, _, city in self.mention_spans(key, offsets)))
+
+    # Every whole word mention as (start, end, city), in message order, repeats included
+    def mention_spans(self, key: str, offsets):
+        starts = {start for start, _ in offsets}
+        ends = {end for _, end in offsets}
+        matches = sorted(
+            (start, start - end, self._ranks[city_id], end, city_id)
+            for start, end, city_id in self._scan(key)
+            if start in starts and end in ends
+        )
+        found = []
+        last_end = 0
+        for start, _, _, end, city_id in matches:
+            if start >= last_end:
+                last_end = end
+                found.append((start, end, self.cities[city_id]))
+        return found
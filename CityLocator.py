@@ -0,0 +1,84 @@
+import math
+from array import array
+
+# mean Earth radius, km
+EARTH_RADIUS = 6371.0088
+
+
+# Point on the unit sphere: straight line distances between these grow with
+# the great-circle distance, and nothing breaks at the poles or the date line
+def _unit(lat, lon):
+    phi, lam = math.radians(lat), math.radians(lon)
+    return math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi)
+
+
+class CityLocator:
+    """Nearest gazetteer city to a position: a k-d tree over unit vectors.
+
+    The tree is implicit: every range of `_order` has its node in the middle
+    and the two halves as subtrees, split on x, y and z in turn. Building it
+    sorts each level once; a lookup visits O(log n) nodes. Equally distant
+    cities go to the more populous (lower record index).
+    """
+
+    def __init__(self, gazetteer):
+        self.gazetteer = gazetteer
+        xs, ys, zs = array("d"), array("d"), array("d")
+        for lat, lon in gazetteer.all_coordinates():
+            x, y, z = _unit(lat, lon)
+            xs.append(x)
+            ys.append(y)
+            zs.append(z)
+        self._axes = (xs, ys, zs)
+
+        order = list(range(len(xs)))
+        split = bytearray(len(order))
+        stack = [(0, len(order), 0)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if hi - lo <= 1:
+                continue
+            order[lo:hi] = sorted(order[lo:hi], key=self._axes[axis].__getitem__)
+            mid = (lo + hi) // 2
+            split[mid] = axis
+            stack.append((lo, mid, (axis + 1) % 3))
+            stack.append((mid + 1, hi, (axis + 1) % 3))
+        self._order = array("I", order)
+        self._split = bytes(split)
+
+    def __len__(self):
+        return len(self._order)
+
+    # (gazetteer record, distance in km) of the closest city, None when the gazetteer is empty
+    def nearest(self, lat, lon):
+        query = _unit(lat, lon)
+        qx, qy, qz = query
+        xs, ys, zs = axes = self._axes
+        order, split = self._order, self._split
+        best, best_d = -1, math.inf
+
+        stack = [(0, len(order), 0.0)]
+        while stack:
+            lo, hi, bound = stack.pop()
+            # the whole range lies beyond the splitting plane of its parent
+            if lo >= hi or bound > best_d:
+                continue
+            mid = (lo + hi) // 2
+            i = order[mid]
+            dx, dy, dz = qx - xs[i], qy - ys[i], qz - zs[i]
+            d = dx * dx + dy * dy + dz * dz
+            if d < best_d or (d == best_d and i < best):
+                best, best_d = i, d
+            axis = split[mid]
+            diff = query[axis] - axes[axis][i]
+            if diff < 0:
+                stack.append((mid + 1, hi, diff * diff))
+                stack.append((lo, mid, 0.0))
+            else:
+                stack.append((lo, mid, diff * diff))
+                stack.append((mid + 1, hi, 0.0))
+
+        if best < 0:
+            return None
+        chord = math.sqrt(best_d)
+        return self.gazetteer[best], 2 * math.asin(min(1.0, chord / 2)) * EARTH_RADIUS
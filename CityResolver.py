@@ -0,0 +1,126 @@
+from array import array
+from collections import Counter
+from itertools import chain
+
+try:
+    # Case 1: imported as a package: from WeatherBot.CityResolver import CityResolver
+    from WeatherBot.CityIndex import compact
+    from WeatherBot.SpellEngine import _deletes, edit_distance
+except ImportError:
+    # Case 2: run from inside WeatherBot/ as a plain script
+    from CityIndex import compact
+    from SpellEngine import _deletes, edit_distance
+
+# Keys up to this long can be one edit from a name without sharing a single
+# trigram with it ("loyn", "lyon"); they are looked up by deletions instead
+SHORT_KEY = 4
+
+
+def _trigrams(key):
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CityResolver:
+    """Typo tolerant city lookup: trigram inverted index plus bounded edit distance.
+
+    Built once from a population-sorted city list (position is the rank, as
+    in CityIndex). Postings are split by name length, so a lookup only counts
+    the names whose length is within k of the query. An edit changes at most
+    4 trigrams (a transposition), so a name within k edits shares all but at
+    most 4k of them; only names reaching that overlap are compared, best
+    overlaps first and at most `max_checks` of them. Keys of up to SHORT_KEY
+    characters are one edit from too few trigrams for that filter, so names
+    of up to one more character are also indexed under their one-character
+    deletions, as in SpellEngine; two strings one edit apart always share
+    one. Results are ordered by distance, then population.
+    """
+
+    def __init__(self, cities, max_distance=2, max_checks=64):
+        self.max_distance = max_distance
+        self.max_checks = max_checks
+        self.cities = []
+        self._keys = []
+        sizes = []
+        postings = {}
+        short = {}
+        seen = set()
+        for city in cities:
+            key = compact(city)
+            # homonyms keep the most populous, which comes first
+            if len(key) < 3 or key in seen:
+                continue
+            seen.add(key)
+            city_id = len(self.cities)
+            self.cities.append(city)
+            self._keys.append(key)
+            grams = _trigrams(key)
+            sizes.append(min(len(grams), 255))
+            for gram in grams:
+                postings.setdefault((gram, len(key)), []).append(city_id)
+            if len(key) <= SHORT_KEY + 1:
+                for deleted in _deletes(key, 1):
+                    short.setdefault(deleted, []).append(city_id)
+        self._sizes = array("B", sizes)
+        self._postings = {gram: array("I", ids) for gram, ids in postings.items()}
+        self._short = {deleted: array("I", ids) for deleted, ids in short.items()}
+
+    def __len__(self):
+        return len(self.cities)
+
+    # Edits allowed for a query: one for short names, `max_distance` from 9 characters
+    def budget(self, key):
+        return 1 if len(key) <= 8 else self.max_distance
+
+    # [(city, distance)] within the edit budget, closest then most populous first
+    def candidates(self, word, max_distance=None, limit=5):
+        key = compact(word)
+        if len(key) < 3:
+            return []
+        k = self.budget(key) if max_distance is None else max_distance
+        if len(key) <= SHORT_KEY and k == 1:
+            return self._short_candidates(key, limit)
+        grams = _trigrams(key)
+        # trigrams a name within k edits can differ by, on either side
+        slack = 4 * k
+        need = max(1, len(grams) - slack)
+
+        empty = ()
+        postings = self._postings
+        lengths = range(max(3, len(key) - k), len(key) + k + 1)
+        overlap = Counter(chain.from_iterable(
+            postings.get((gram, n), empty) for gram in grams for n in lengths
+        ))
+        sizes = self._sizes
+        shortlist = [
+            city_id for city_id, shared in overlap.items()
+            if shared >= need and shared + slack >= sizes[city_id]
+        ]
+        if len(shortlist) > self.max_checks:
+            shortlist.sort(key=lambda city_id: (-overlap[city_id], city_id))
+            del shortlist[self.max_checks:]
+
+        keys = self._keys
+        found = []
+        for city_id in shortlist:
+            dist = edit_distance(key, keys[city_id], k)
+            if dist <= k:
+                found.append((dist, city_id))
+        found.sort()
+        return [(self.cities[city_id], dist) for dist, city_id in found[:limit]]
+
+    # One edit from a short key: the names sharing one of its deletions
+    def _short_candidates(self, key, limit):
+        empty = ()
+        shortlist = {city_id for deleted in _deletes(key, 1) for city_id in self._short.get(deleted, empty)}
+        keys = self._keys
+        found = sorted(
+            (dist, city_id) for dist, city_id in ((edit_distance(key, keys[i], 1), i) for i in shortlist)
+            if dist <= 1
+        )
+        return [(self.cities[city_id], dist) for dist, city_id in found[:limit]]
+
+    # Closest city to `word`, None when nothing is within the budget
+    def resolve(self, word, max_distance=None):
+        found = self.candidates(word, max_distance, limit=1)
+        return found[0][0] if found else None
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ForecastCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Expired entries are kept `stale_ttl` seconds longer for `get_stale`, so
+    callers can answer with them while a fresh value is fetched. Keeps hit
+    and miss counters so the cache efficiency can be reported.
+    """
+
+    def __init__(self, ttl: float = 600, maxsize: int = 256, clock=time.monotonic, stale_ttl: float = 0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    # Cached value, or None when it is missing or expired
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._clock() - entry[1] < self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None and self._clock() - entry[1] >= self.ttl + self.stale_ttl:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    # (value, age in seconds), stale values included; (None, None) when missing or too old
+    def get_stale(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                age = self._clock() - entry[1]
+                if age < self.ttl + self.stale_ttl:
+                    self._data.move_to_end(key)
+                    if age < self.ttl:
+                        self.hits += 1
+                    else:
+                        self.stale_hits += 1
+                    return entry[0], age
+                del self._data[key]
+            self.misses += 1
+            return None, None
+
+    # Seconds since the value was stored, None when there is none
+    def age(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return None if entry is None else self._clock() - entry[1]
+
+    # age: seconds the value has already lived, e.g. when it comes from a shared store
+    def put(self, key, value, age: float = 0.0):
+        with self._lock:
+            self._data[key] = (value, self._clock() - age)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.stale_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / total if total else 0.0,
+        }
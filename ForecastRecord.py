@@ -0,0 +1,323 @@
+import datetime
+import math
+from array import array
+from collections.abc import Mapping
+
+try:
+    # Case 1: imported as a package: from WeatherBot.ForecastRecord import ForecastRecord
+    from WeatherBot.config import WEATHER_CODE_MAP
+except ImportError:
+    # Case 2: run from inside WeatherBot/ as a plain script
+    from config import WEATHER_CODE_MAP
+
+# Hourly variables requested along with the daily ones, in the same call
+HOURLY_VARIABLES = "temperature_2m,precipitation_probability,precipitation,weathercode,windspeed_10m"
+
+# Missing values: weather code, minutes of a sunrise/sunset (floats use NaN)
+_NO_CODE = -1
+_NO_TIME = -(2 ** 31)
+# and in the hourly arrays, which hold tenths in small integers
+_NO_TEMP = -(2 ** 15)
+_NO_BYTE = 2 ** 8 - 1
+_NO_SHORT = 2 ** 16 - 1
+
+
+def _float(value):
+    return math.nan if value is None else value
+
+
+def _value(x):
+    return None if math.isnan(x) else x
+
+
+# "2025-11-24T06:53" -> minutes from the midnight of day `ordinal`
+def _minutes(iso, ordinal):
+    if not iso:
+        return _NO_TIME
+    dt = datetime.datetime.fromisoformat(iso)
+    return (dt.toordinal() - ordinal) * 1440 + dt.hour * 60 + dt.minute
+
+
+# Open-Meteo gives one decimal, kept exactly as an integer number of tenths
+def _tenths(typecode, values, missing):
+    return array(typecode, (missing if v is None else round(v * 10) for v in values))
+
+
+def _integers(typecode, values, missing):
+    return array(typecode, (missing if v is None else v for v in values))
+
+
+def _from_tenths(x, missing):
+    return None if x == missing else x / 10
+
+
+def _iso_time(ordinal, minutes):
+    if minutes == _NO_TIME:
+        return None
+    days, minutes = divmod(minutes, 1440)
+    return f"{datetime.date.fromordinal(ordinal + days).isoformat()}T{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class ForecastRecord:
+    """Daily forecast of one location, one packed array per variable.
+
+    Open-Meteo returns consecutive days, so only the first one is kept (as
+    an ordinal) and a date resolves to its row with one subtraction. Sunrise
+    and sunset are minutes from the midnight of their day. `day` hands out
+    the per-day answer as a read-only mapping over the arrays.
+
+    The hourly series (168 points for 7 days) is stored as tenths in 8 bytes
+    per hour: temperature, precipitation and wind in 16 bit integers,
+    precipitation probability and weather code in bytes. `hour0` is the
+    first hour's offset from the first day's midnight. `hours` slices it
+    lazily for a time window.
+    """
+
+    __slots__ = ("start", "weathercode", "temp_max", "temp_min", "wind", "sunrise", "sunset",
+                 "current_temp", "current_wind", "latitude", "longitude",
+                 "hour0", "h_temp", "h_precip_prob", "h_precip", "h_code", "h_wind")
+
+    def __init__(self, start, weathercode, temp_max, temp_min, wind, sunrise, sunset,
+                 current_temp=None, current_wind=None, latitude=None, longitude=None, hourly=None):
+        self.start = start
+        self.weathercode = weathercode
+        self.temp_max = temp_max
+        self.temp_min = temp_min
+        self.wind = wind
+        self.sunrise = sunrise
+        self.sunset = sunset
+        self.current_temp = current_temp
+        self.current_wind = current_wind
+        self.latitude = latitude
+        self.longitude = longitude
+        self.hour0, self.h_temp, self.h_precip_prob, self.h_precip, self.h_code, self.h_wind = hourly or (
+            0, array("h"), array("B"), array("H"), array("B"), array("H")
+        )
+
+    # From an Open-Meteo forecast payload with a non empty daily section
+    @classmethod
+    def from_payload(cls, data: dict):
+        daily = data["daily"]
+        start = datetime.date.fromisoformat(daily["time"][0]).toordinal()
+        days = range(len(daily["time"]))
+        cw = data.get("current_weather")
+        hourly = data.get("hourly")
+        if hourly and hourly.get("time"):
+            first = datetime.datetime.fromisoformat(hourly["time"][0])
+            hourly = (
+                (first.toordinal() - start) * 24 + first.hour,
+                _tenths("h", hourly["temperature_2m"], _NO_TEMP),
+                _integers("B", hourly["precipitation_probability"], _NO_BYTE),
+                _tenths("H", hourly["precipitation"], _NO_SHORT),
+                _integers("B", hourly["weathercode"], _NO_BYTE),
+                _tenths("H", hourly["windspeed_10m"], _NO_SHORT),
+            )
+        else:
+            hourly = None
+        return cls(
+            start,
+            array("h", (_NO_CODE if c is None else c for c in daily["weathercode"])),
+            array("d", map(_float, daily["temperature_2m_max"])),
+            array("d", map(_float, daily["temperature_2m_min"])),
+            array("d", map(_float, daily["windspeed_10m_max"])),
+            array("i", (_minutes(daily["sunrise"][i], start + i) for i in days)),
+            array("i", (_minutes(daily["sunset"][i], start + i) for i in days)),
+            cw["temperature"] if cw else None,
+            cw["windspeed"] if cw else None,
+            data.get("latitude"),
+            data.get("longitude"),
+            hourly,
+        )
+
+    # Back to the payload shape, for the JSON store
+    def to_payload(self) -> dict:
+        days = range(len(self))
+        payload = {
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "daily": {
+                "time": [self.date(i).isoformat() for i in days],
+                "weathercode": [None if c == _NO_CODE else c for c in self.weathercode],
+                "temperature_2m_max": [_value(x) for x in self.temp_max],
+                "temperature_2m_min": [_value(x) for x in self.temp_min],
+                "windspeed_10m_max": [_value(x) for x in self.wind],
+                "sunrise": [_iso_time(self.start + i, self.sunrise[i]) for i in days],
+                "sunset": [_iso_time(self.start + i, self.sunset[i]) for i in days],
+            },
+        }
+        if self.current_temp is not None or self.current_wind is not None:
+            payload["current_weather"] = {"temperature": self.current_temp, "windspeed": self.current_wind}
+        if self.h_code:
+            payload["hourly"] = {
+                "time": [self.hour_time(i) for i in range(len(self.h_code))],
+                "temperature_2m": [_from_tenths(x, _NO_TEMP) for x in self.h_temp],
+                "precipitation_probability": [None if x == _NO_BYTE else x for x in self.h_precip_prob],
+                "precipitation": [_from_tenths(x, _NO_SHORT) for x in self.h_precip],
+                "weathercode": [None if x == _NO_BYTE else x for x in self.h_code],
+                "windspeed_10m": [_from_tenths(x, _NO_SHORT) for x in self.h_wind],
+            }
+        return payload
+
+    def __len__(self):
+        return len(self.weathercode)
+
+    def date(self, idx) -> datetime.date:
+        return datetime.date.fromordinal(self.start + idx)
+
+    # Row of a date; dates outside the forecast get the closest day
+    def day_index(self, target_date: datetime.date) -> int:
+        return min(max(target_date.toordinal() - self.start, 0), len(self) - 1)
+
+    def day(self, target_date: datetime.date, city: str, time_keyword: str | None = None, hours=None):
+        return DayWeather(self, self.day_index(target_date), city, time_keyword, hours)
+
+    # ISO time of hourly point i
+    def hour_time(self, i) -> str:
+        return _iso_time(self.start, (self.hour0 + i) * 60)
+
+    # Hours [start_hour, end_hour) of the day at row idx, None without hourly data for them
+    def hours(self, idx, start_hour, end_hour):
+        offset = idx * 24 - self.hour0
+        lo = max(offset + start_hour, 0)
+        hi = min(offset + end_hour, len(self.h_code))
+        return HourlyWindow(self, lo, hi) if lo < hi else None
+
+
+class HourlyWindow:
+    """A range of hours of a ForecastRecord, read from its arrays when asked."""
+
+    __slots__ = ("record", "lo", "hi")
+
+    def __init__(self, record, lo, hi):
+        self.record = record
+        self.lo = lo
+        self.hi = hi
+
+    def __len__(self):
+        return self.hi - self.lo
+
+    def _values(self, column, missing):
+        return [x for x in column[self.lo:self.hi] if x != missing]
+
+    @property
+    def start(self) -> str:
+        return self.record.hour_time(self.lo)
+
+    # first hour after the window
+    @property
+    def end(self) -> str:
+        return self.record.hour_time(self.hi)
+
+    @property
+    def temp_min(self):
+        values = self._values(self.record.h_temp, _NO_TEMP)
+        return min(values) / 10 if values else None
+
+    @property
+    def temp_max(self):
+        values = self._values(self.record.h_temp, _NO_TEMP)
+        return max(values) / 10 if values else None
+
+    # highest chance of precipitation in the window, in %
+    @property
+    def precipitation_probability(self):
+        values = self._values(self.record.h_precip_prob, _NO_BYTE)
+        return max(values) if values else None
+
+    # total precipitation in mm
+    @property
+    def precipitation(self):
+        values = self._values(self.record.h_precip, _NO_SHORT)
+        return round(sum(values) / 10, 1) if values else None
+
+    # the most severe weather of the window, WMO codes grow with severity
+    @property
+    def weathercode(self):
+        values = self._values(self.record.h_code, _NO_BYTE)
+        return max(values) if values else None
+
+    @property
+    def wind(self):
+        values = self._values(self.record.h_wind, _NO_SHORT)
+        return max(values) / 10 if values else None
+
+    # (time, temperature, precipitation probability, precipitation, weather code, wind) per hour
+    def __iter__(self):
+        r = self.record
+        for i in range(self.lo, self.hi):
+            yield (
+                r.hour_time(i),
+                _from_tenths(r.h_temp[i], _NO_TEMP),
+                None if r.h_precip_prob[i] == _NO_BYTE else r.h_precip_prob[i],
+                _from_tenths(r.h_precip[i], _NO_SHORT),
+                None if r.h_code[i] == _NO_BYTE else r.h_code[i],
+                _from_tenths(r.h_wind[i], _NO_SHORT),
+            )
+
+
+# How each key of a DayWeather is read from its record and row
+_FIELDS = {
+    "status": lambda w, r, i: "ok",
+    "city": lambda w, r, i: w.city,
+    "requested_keyword": lambda w, r, i: w.time_keyword,
+    "date": lambda w, r, i: r.date(i).isoformat(),
+    "description": lambda w, r, i: WEATHER_CODE_MAP.get(_FIELDS["weathercode"](w, r, i), "Unknown weather"),
+    "weathercode": lambda w, r, i: None if r.weathercode[i] == _NO_CODE else r.weathercode[i],
+    "temp_max": lambda w, r, i: _value(r.temp_max[i]),
+    "temp_min": lambda w, r, i: _value(r.temp_min[i]),
+    "daily_wind": lambda w, r, i: _value(r.wind[i]),
+    "sunrise": lambda w, r, i: _iso_time(r.start + i, r.sunrise[i]),
+    "sunset": lambda w, r, i: _iso_time(r.start + i, r.sunset[i]),
+    # current conditions only make sense for today
+    "current_temp": lambda w, r, i: r.current_temp if i == 0 else None,
+    "current_wind": lambda w, r, i: r.current_wind if i == 0 else None,
+}
+
+# Extra keys of a DayWeather asked for a time window that the hourly data covers
+_HOURLY_FIELDS = {
+    "hour_start": lambda h: h.start,
+    "hour_end": lambda h: h.end,
+    "hourly_description": lambda h: WEATHER_CODE_MAP.get(h.weathercode, "Unknown weather"),
+    "hourly_weathercode": lambda h: h.weathercode,
+    "hourly_temp_min": lambda h: h.temp_min,
+    "hourly_temp_max": lambda h: h.temp_max,
+    "precipitation_probability": lambda h: h.precipitation_probability,
+    "precipitation": lambda h: h.precipitation,
+    "hourly_wind": lambda h: h.wind,
+}
+
+
+class DayWeather(Mapping):
+    """The weather of one day, read as the dict `WeatherAPI.get_weather` always returned.
+
+    Given `hours` (start, end) it also has the hourly keys, summarizing that
+    window, when the forecast has hourly data for it.
+    """
+
+    __slots__ = ("record", "idx", "city", "time_keyword", "window")
+
+    def __init__(self, record, idx, city, time_keyword, hours=None):
+        self.record = record
+        self.idx = idx
+        self.city = city
+        self.time_keyword = time_keyword
+        self.window = record.hours(idx, *hours) if hours else None
+
+    def __getitem__(self, key):
+        field = _FIELDS.get(key)
+        if field is not None:
+            return field(self, self.record, self.idx)
+        if self.window is not None and key in _HOURLY_FIELDS:
+            return _HOURLY_FIELDS[key](self.window)
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from _FIELDS
+        if self.window is not None:
+            yield from _HOURLY_FIELDS
+
+    def __len__(self):
+        return len(_FIELDS) + (len(_HOURLY_FIELDS) if self.window is not None else 0)
+
+    def __repr__(self):
+        return repr(dict(self))
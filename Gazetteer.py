@@ -0,0 +1,173 @@
+import csv
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from collections import namedtuple
+
+try:
+    from WeatherBot.CityIndex import compact
+except ImportError:
+    from CityIndex import compact
+
+# magic, format version, reserved, record count, timezone table size, string blob size
+HEADER = struct.Struct("<4sHHIII")
+# name offset/length, ascii name offset/length, population, lat, lon, country code, timezone id
+RECORD = struct.Struct("<IHIHIff2sH")
+MAGIC = b"WBGZ"
+VERSION = 1
+
+City = namedtuple("City", "name asciiname country population latitude longitude timezone")
+
+# Columns of the GeoNames dump (cities1000.txt) we keep
+_NAME, _ASCIINAME, _LAT, _LON, _COUNTRY, _POPULATION, _TIMEZONE = 1, 2, 4, 5, 8, 14, 17
+
+
+# Read cities1000.txt, most populous first
+def read_geonames(path):
+    csv.field_size_limit(sys.maxsize)
+    rows = []
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE):
+            if len(row) <= _TIMEZONE or not row[_NAME]:
+                continue
+            try:
+                population = int(row[_POPULATION] or 0)
+                lat, lon = float(row[_LAT]), float(row[_LON])
+            except ValueError:
+                continue
+            rows.append((row[_NAME], row[_ASCIINAME], row[_COUNTRY], population, lat, lon, row[_TIMEZONE]))
+    rows.sort(key=lambda r: r[3], reverse=True)
+    return rows
+
+
+# Offline build step: cities1000.txt -> compact gazetteer file. The file is
+# written next to dst and renamed over it, so processes building it at the
+# same time never map a half-written one.
+def build_gazetteer(src, dst):
+    rows = read_geonames(src)
+
+    blob = bytearray()
+    offsets = {}
+
+    def intern(text):
+        if text not in offsets:
+            data = text.encode("utf-8")
+            offsets[text] = (len(blob), len(data))
+            blob.extend(data)
+        return offsets[text]
+
+    timezones = {}
+    records = bytearray()
+    for name, asciiname, country, population, lat, lon, tz in rows:
+        name_off, name_len = intern(name)
+        ascii_off, ascii_len = intern(asciiname or name)
+        tz_id = timezones.setdefault(tz, len(timezones))
+        records += RECORD.pack(
+            name_off, name_len, ascii_off, ascii_len, population, lat, lon,
+            country.encode("ascii", "replace")[:2].ljust(2), tz_id,
+        )
+
+    tz_table = "\n".join(timezones).encode("utf-8")
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dst)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(rows), len(tz_table), len(blob)))
+            f.write(records)
+            f.write(tz_table)
+            f.write(blob)
+        os.replace(tmp, dst)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return len(rows)
+
+
+class Gazetteer:
+    """Read-only, memory-mapped view of a gazetteer file.
+
+    Records are sorted by population, most populous first, and decoded only
+    when accessed, so opening the file costs almost nothing and the pages
+    are shared between every process that maps it.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, tz_size, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} gazetteer file")
+        self._count = count
+        self._records = HEADER.size
+        tz_offset = self._records + count * RECORD.size
+        self._strings = tz_offset + tz_size
+        self.timezones = self._mm[tz_offset:self._strings].decode("utf-8").split("\n")
+
+    # Check the header of an existing file without mapping it, and that it was
+    # built after the last change to `source` when that file is there
+    @staticmethod
+    def is_current(path, source=None):
+        try:
+            with open(path, "rb") as f:
+                magic, version, *_ = HEADER.unpack(f.read(HEADER.size))
+            built = os.path.getmtime(path)
+        except (OSError, struct.error):
+            return False
+        if magic != MAGIC or version != VERSION:
+            return False
+        try:
+            return source is None or os.path.getmtime(source) <= built
+        except OSError:
+            return True
+
+    def __len__(self):
+        return self._count
+
+    def _raw(self, i):
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return RECORD.unpack_from(self._mm, self._records + i * RECORD.size)
+
+    def _text(self, off, length):
+        start = self._strings + off
+        return self._mm[start:start + length].decode("utf-8")
+
+    def __getitem__(self, i):
+        name_off, name_len, ascii_off, ascii_len, population, lat, lon, country, tz = self._raw(i)
+        return City(
+            self._text(name_off, name_len), self._text(ascii_off, ascii_len),
+            country.decode("ascii").strip(), population, round(lat, 5), round(lon, 5), self.timezones[tz],
+        )
+
+    def __iter__(self):
+        return (self[i] for i in range(self._count))
+
+    def name(self, i):
+        name_off, name_len = self._raw(i)[:2]
+        return self._text(name_off, name_len)
+
+    def country(self, i):
+        return self._raw(i)[7].decode("ascii").strip()
+
+    # stored as float32, rounded back to the 5 decimals of the source file
+    def coordinates(self, i):
+        lat, lon = self._raw(i)[5:7]
+        return round(lat, 5), round(lon, 5)
+
+    # (lat, lon) of every record in order, unpacked in one pass over the mapping
+    def all_coordinates(self):
+        end = self._records + self._count * RECORD.size
+        return ((r[5], r[6]) for r in RECORD.iter_unpack(self._mm[self._records:end]))
+
+    # compact name or ascii name -> most populous record, for the records called one of `names`
+    def name_index(self, names):
+        wanted = set(names)
+        index = {}
+        for i in range(self._count):
+            name_off, name_len, ascii_off, ascii_len = self._raw(i)[:4]
+            name = self._text(name_off, name_len)
+            if name in wanted:
+                index.setdefault(compact(name), i)
+                index.setdefault(compact(self._text(ascii_off, ascii_len)), i)
+        return index
@@ -0,0 +1,45 @@
+# Key under which a trie node stores the priority of the keyword ending there
+_END = None
+
+
+class IntentMatcher:
+    """Phrase trie over the tokens of every intent keyword.
+
+    Single word keywords live on the first level of the trie, so they are a
+    plain dict lookup; multi word ones ("how are you") continue down it. A
+    message is scanned once and the intent that comes first in the keyword
+    dict wins, like the chained regexes did.
+    """
+
+    def __init__(self, keywords: dict):
+        self.intents = list(keywords)
+        self._root = {}
+        for priority, kw_list in enumerate(keywords.values()):
+            for kw in kw_list:
+                tokens = kw.split()
+                if tokens:
+                    self._add(tokens, priority)
+
+    def _add(self, tokens, priority):
+        node = self._root
+        for tok in tokens:
+            node = node.setdefault(tok, {})
+        node[_END] = min(priority, node.get(_END, priority))
+
+    # Return the highest priority intent found in a normalized message
+    def match(self, message: str) -> str:
+        tokens = message.split()
+        n = len(tokens)
+        best = None
+        for start in range(n):
+            node = self._root
+            for i in range(start, n):
+                node = node.get(tokens[i])
+                if node is None:
+                    break
+                priority = node.get(_END)
+                if priority is not None and (best is None or priority < best):
+                    best = priority
+                    if best == 0:
+                        return self.intents[0]
+        return self.intents[best] if best is not None else "unknown"
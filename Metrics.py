@@ -0,0 +1,158 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Stage timings of the request running in the current thread or task
+_current = contextvars.ContextVar("weatherbot_request", default=None)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """Stage latency histograms and counters for the chat pipeline.
+
+    When disabled, `span` hands out a shared no-op context manager and
+    `inc` returns immediately, so instrumented code pays one attribute
+    check. Exports to Prometheus text format or JSON.
+    """
+
+    def __init__(self, enabled: bool = False, buckets=DEFAULT_BUCKETS, prefix: str = "weatherbot"):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    # Time a block of code under a stage name
+    def span(self, stage: str):
+        return _Span(self, stage) if self.enabled else _NULL_SPAN
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if hist is None:
+                hist = self._histograms[stage] = _Histogram(len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist.counts[i] += 1
+                    break
+            hist.total += seconds
+            hist.count += 1
+        breakdown = _current.get()
+        if breakdown is not None:
+            breakdown[stage] = breakdown.get(stage, 0.0) + seconds
+
+    # Count an event, labels become Prometheus labels
+    def inc(self, name: str, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    # Collect the stage timings of one request into the yielded dict
+    @contextmanager
+    def request(self):
+        if not self.enabled:
+            yield {}
+            return
+        breakdown = {}
+        token = _current.set(breakdown)
+        try:
+            yield breakdown
+        finally:
+            _current.reset(token)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": hist.count,
+                    "sum": hist.total,
+                    "buckets": dict(zip((str(b) for b in self.buckets), hist.counts)),
+                }
+                for stage, hist in self._histograms.items()
+            }
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self._counters.items()
+            ]
+        return {"stages": stages, "counters": counters}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=1)
+
+    def to_prometheus(self) -> str:
+        snap = self.snapshot()
+        name = f"{self.prefix}_stage_seconds"
+        lines = [f"# TYPE {name} histogram"]
+        for stage, hist in sorted(snap["stages"].items()):
+            cumulative = 0
+            for bound, count in hist["buckets"].items():
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {hist["count"]}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {hist["sum"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {hist["count"]}')
+
+        typed = set()
+        for counter in sorted(snap["counters"], key=lambda c: (c["name"], sorted(c["labels"].items()))):
+            full = f"{self.prefix}_{counter['name']}"
+            if full not in typed:
+                lines.append(f"# TYPE {full} counter")
+                typed.add(full)
+            labels = ",".join(f'{k}="{v}"' for k, v in counter["labels"].items())
+            lines.append(f"{full}{{{labels}}} {counter['value']}" if labels else f"{full} {counter['value']}")
+        return "\n".join(lines) + "\n"
+
+
+# Process wide registry, turned on with WEATHERBOT_METRICS=1
+METRICS = Metrics(enabled=os.environ.get("WEATHERBOT_METRICS") == "1")
@@ -0,0 +1,77 @@
+import os
+import threading
+
+try:
+    # Case 1: imported as a package: from WeatherBot.Prefetcher import Prefetcher
+    from WeatherBot.Metrics import METRICS
+except ImportError:
+    # Case 2: run from inside WeatherBot/ as a plain script
+    from Metrics import METRICS
+
+
+class Prefetcher:
+    """Keeps the forecasts of the most asked about cities warm.
+
+    `record` counts the cities found in messages. Every `interval` seconds a
+    background thread takes the `top` cities and refetches, in bulk, the
+    forecasts that are missing or due to expire within `lead` seconds. Counts
+    are multiplied by `decay` after each pass, so the ranking follows recent
+    demand. The thread starts on the first `record` of each process.
+    """
+
+    def __init__(self, api, top: int = 20, interval: float = 60, lead: float = 120, decay: float = 0.5):
+        self.api = api
+        self.top = top
+        self.interval = interval
+        self.lead = lead
+        self.decay = decay
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def record(self, cities):
+        with self._lock:
+            for city in cities:
+                if city:
+                    self._counts[city] = self._counts.get(city, 0) + 1
+            # threads do not survive a fork, every worker process runs its own
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="forecast-prefetch", daemon=True)
+                self._thread.start()
+
+    def hot(self):
+        with self._lock:
+            return sorted(self._counts, key=self._counts.get, reverse=True)[:self.top]
+
+    # Refresh the forecasts of the hot cities that are missing or about to expire
+    def run_once(self):
+        api = self.api
+        due = []
+        for city in self.hot():
+            lat, lon, _ = api.geocode_city(city)
+            if lat is None:
+                continue
+            age = api.forecast_cache.age(api.location_key(lat, lon))
+            if age is None or age >= api.forecast_cache.ttl - self.lead:
+                due.append((lat, lon))
+        if due:
+            api.refresh_forecasts(due)
+            METRICS.inc("prefetch_total", len(due))
+
+        with self._lock:
+            self._counts = {c: n * self.decay for c, n in self._counts.items() if n * self.decay >= 0.5}
+        return len(due)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                METRICS.inc("errors_total", stage="prefetch")
+
+    def stop(self):
+        self._stop.set()
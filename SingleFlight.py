@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for it and get the same result (or exception). `do`
+    serves threads, `ado` serves coroutines on an event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._futures = {}
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key, coro_fn, *args):
+        # futures belong to one loop, so loops never share an in-flight call
+        fkey = (id(asyncio.get_running_loop()), key)
+        future = self._futures.get(fkey)
+        if future is None:
+            future = asyncio.ensure_future(coro_fn(*args))
+            self._futures[fkey] = future
+            future.add_done_callback(lambda _: self._futures.pop(fkey, None))
+        # a cancelled waiter must not cancel the call the others are waiting on
+        return await asyncio.shield(future)
@@ -0,0 +1,107 @@
+import functools
+
+
+# All strings obtained by deleting up to `distance` characters from `word`
+def _deletes(word, distance):
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        nxt = set()
+        for w in frontier:
+            if len(w) <= 1:
+                continue
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        nxt -= found
+        found |= nxt
+        frontier = nxt
+    return found
+
+
+# Optimal string alignment distance, capped at limit + 1.
+# Bit-parallel (Hyyro 2003): one pass over b, with a column of the DP matrix
+# for a held in the bits of a few integers.
+def edit_distance(a, b, limit):
+    m = len(a)
+    if abs(m - len(b)) > limit:
+        return limit + 1
+    if not m:
+        return min(len(b), limit + 1)
+    peq = {}
+    for i, c in enumerate(a):
+        peq[c] = peq.get(c, 0) | 1 << i
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    vp, vn, d0, pm_prev = mask, 0, 0, 0
+    score = m
+    for c in b:
+        pm = peq.get(c, 0)
+        tr = ((~d0 & pm) << 1) & pm_prev
+        d0 = ((((pm & vp) + vp) ^ vp) | pm | vn | tr) & mask
+        hp = vn | ~(d0 | vp) & mask
+        hn = d0 & vp
+        if hp & high:
+            score += 1
+        elif hn & high:
+            score -= 1
+        hp = (hp << 1 | 1) & mask
+        hn = (hn << 1) & mask
+        vp = hn | ~(d0 | hp) & mask
+        vn = hp & d0
+        pm_prev = pm
+    return min(score, limit + 1)
+
+
+class SpellEngine:
+    """SymSpell style corrector over a small domain vocabulary.
+
+    Every vocabulary word is indexed under all its deletions up front, so a
+    lookup only has to generate the deletions of the misspelled word and
+    read them from a dict. Results are memoized in an LRU cache.
+    """
+
+    def __init__(self, max_distance=2, known=None, memo_size=4096):
+        self.max_distance = max_distance
+        # extra words that are never corrected, e.g. a general English dictionary
+        self.known = known if known is not None else ()
+        # word -> (rank, max distance it may be reached from)
+        self._words = {}
+        self._index = {}
+        self.correct = functools.lru_cache(maxsize=memo_size)(self._correct)
+
+    def __contains__(self, word):
+        return word in self._words or word in self.known
+
+    # Add words in priority order: earlier words win ties at the same distance
+    def add_words(self, words, max_distance=None):
+        distance = self.max_distance if max_distance is None else max_distance
+        for word in words:
+            if not word or word in self._words:
+                continue
+            self._words[word] = (len(self._words), distance)
+            for key in _deletes(word, distance):
+                self._index.setdefault(key, []).append(word)
+        self.correct.cache_clear()
+
+    # Vocabulary words within the allowed distance, best first
+    def lookup(self, word):
+        limit = 1 if len(word) <= 4 else self.max_distance
+        seen = set()
+        matches = []
+        for key in _deletes(word, limit):
+            for candidate in self._index.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                rank, reach = self._words[candidate]
+                dist = edit_distance(word, candidate, min(limit, reach))
+                if dist <= min(limit, reach):
+                    matches.append((dist, rank, candidate))
+        matches.sort()
+        return [candidate for _, _, candidate in matches]
+
+    def _correct(self, word):
+        if not word or word in self:
+            return word
+        matches = self.lookup(word)
+        return matches[0] if matches else word
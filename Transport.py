@@ -0,0 +1,252 @@
+import asyncio
+import datetime
+import gzip
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+class ReplayMiss(LookupError):
+    pass
+
+
+class Response:
+    """Just enough of a requests/httpx response for WeatherAPI: status, body, json()."""
+
+    __slots__ = ("status_code", "content", "elapsed")
+
+    def __init__(self, status_code: int, content: bytes, elapsed: float = 0.0):
+        self.status_code = status_code
+        self.content = content
+        self.elapsed = elapsed
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+# Archive key of a request: path and query, the host is left out so a recording
+# made against open-meteo.com replays against any base URL
+def request_key(url, params):
+    query = "&".join(f"{k}={params[k]}" for k in sorted(params))
+    return f"{urlsplit(url).path}?{query}"
+
+
+def shift_dates(value, delta):
+    if isinstance(value, str) and _ISO_DATE.match(value):
+        day = datetime.date.fromisoformat(value[:10]) + delta
+        return day.isoformat() + value[10:]
+    if isinstance(value, list):
+        return [shift_dates(v, delta) for v in value]
+    if isinstance(value, dict):
+        return {k: shift_dates(v, delta) for k, v in value.items()}
+    return value
+
+
+class LiveTransport:
+    """Talks to the real API: requests (or a pooled session) in sync code, httpx in async code.
+
+    An httpx client is bound to the event loop it first ran on, so every
+    running loop gets its own client; those of loops that have since
+    closed are dropped when the next one is created.
+    """
+
+    def __init__(self, session=None, pool_size: int | None = None, timeout: float = 5):
+        self.session = session
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._aclients = {}
+
+    def get(self, url, params):
+        return (self.session or requests).get(url, params=params, timeout=self.timeout)
+
+    async def aget(self, url, params):
+        return await self._async_client().get(url, params=params)
+
+    # Async client of the running loop, created on first use; httpx is only needed by async callers
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._aclients.get(loop)
+        if client is None:
+            import httpx
+
+            limit = self.pool_size or 100
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+            )
+            with self._lock:
+                # a closed loop can neither use nor close its client any more
+                self._aclients = {l: c for l, c in self._aclients.items() if not l.is_closed()}
+                self._aclients[loop] = client
+        return client
+
+    def close(self):
+        pass
+
+    # Closes the client of the running loop, other loops close their own
+    async def aclose(self):
+        with self._lock:
+            client = self._aclients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+class RecordingTransport:
+    """Forwards to another transport and appends every new exchange to a gzip JSONL archive.
+
+    Identical exchanges are written once. Each line is flushed as it is
+    written, so an archive cut short by a crash still replays up to there.
+    """
+
+    def __init__(self, path, inner):
+        self.path = str(path)
+        self.inner = inner
+        self._lock = threading.Lock()
+        self._seen = set()
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+
+    def get(self, url, params):
+        start = time.perf_counter()
+        r = self.inner.get(url, params)
+        return self._record(url, params, r, time.perf_counter() - start)
+
+    async def aget(self, url, params):
+        start = time.perf_counter()
+        r = await self.inner.aget(url, params)
+        return self._record(url, params, r, time.perf_counter() - start)
+
+    def _record(self, url, params, r, elapsed):
+        response = Response(r.status_code, r.content, elapsed)
+        key = request_key(url, params)
+        digest = hashlib.blake2b(f"{key} {r.status_code} ".encode() + r.content, digest_size=16).digest()
+        line = json.dumps({
+            "key": key,
+            "status": r.status_code,
+            "body": response.text,
+            "elapsed": round(elapsed, 4),
+            "date": datetime.date.today().isoformat(),
+        }, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if digest not in self._seen and not self._file.closed:
+                self._seen.add(digest)
+                self._file.write(line + "\n")
+                self._file.flush()
+        return response
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        self.inner.close()
+
+    async def aclose(self):
+        self.close()
+        await self.inner.aclose()
+
+
+class ReplayTransport:
+    """Serves the responses of a recorded archive, never touching the network.
+
+    A request replays the responses recorded for it in turn, then keeps
+    returning the last one. `latency` is a fixed delay in seconds, or None to
+    wait as long as the recorded call took (times `latency_scale`).
+    `error_rate` of the calls fail: with `error_status`, or with a
+    ConnectionError when that is None. Forecast dates are moved forward to
+    today unless `rebase_dates` is off, so old recordings stay answerable.
+    """
+
+    def __init__(self, path, latency: float | None = 0.0, latency_scale: float = 1.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int | None = 503, rebase_dates: bool = True, seed=None):
+        self.path = str(path)
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._turn = {}
+        self.responses = self.load(self.path, rebase_dates)
+
+    @staticmethod
+    def load(path, rebase_dates=True) -> dict:
+        today = datetime.date.today()
+        responses = {}
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    entry = json.loads(line)
+                    body = entry["body"].encode("utf-8")
+                    delta = today - datetime.date.fromisoformat(entry["date"])
+                    if rebase_dates and delta and "/forecast" in entry["key"] and entry["status"] == 200:
+                        body = json.dumps(shift_dates(json.loads(body), delta)).encode("utf-8")
+                    responses.setdefault(entry["key"], []).append(Response(entry["status"], body, entry["elapsed"]))
+            except EOFError:
+                # archive of a recording that did not close cleanly, keep what was written
+                pass
+        return responses
+
+    # Recorded response for a request, an injected failure, and the delay to apply
+    def _next(self, url, params):
+        key = request_key(url, params)
+        recorded = self.responses.get(key)
+        if not recorded:
+            raise ReplayMiss(f"no recorded response for {key}")
+        with self._lock:
+            turn = self._turn.get(key, 0)
+            self._turn[key] = turn + 1
+            failed = self.error_rate and self._random.random() < self.error_rate
+            jitter = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        response = recorded[min(turn, len(recorded) - 1)]
+        delay = (response.elapsed * self.latency_scale if self.latency is None else self.latency) + jitter
+        if failed:
+            if self.error_status is None:
+                return None, delay
+            response = Response(self.error_status, b'{"error":true,"reason":"injected failure"}', delay)
+        return response, delay
+
+    def get(self, url, params):
+        response, delay = self._next(url, params)
+        if delay:
+            time.sleep(delay)
+        if response is None:
+            raise requests.ConnectionError("injected connection failure")
+        return response
+
+    async def aget(self, url, params):
+        response, delay = self._next(url, params)
+        if delay:
+            await asyncio.sleep(delay)
+        if response is None:
+            raise ConnectionError("injected connection failure")
+        return response
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+# Transport from a spec string: "live", "record:<archive>" or "replay:<archive>"
+def make_transport(spec, live):
+    mode, _, path = (spec or "live").partition(":")
+    if mode == "live":
+        return live
+    if mode == "record" and path:
+        return RecordingTransport(path, live)
+    if mode == "replay" and path:
+        return ReplayTransport(path)
+    raise ValueError(f"unknown transport {spec!r}, expected live, record:<path> or replay:<path>")
@@ -0,0 +1,63 @@
+import string
+
+try:
+    # Case 1: imported as a package: from WeatherBot.Utterance import Utterance
+    from WeatherBot.CityIndex import split_words, word_offsets
+except ImportError:
+    # Case 2: run from inside WeatherBot/ as a plain script
+    from CityIndex import split_words, word_offsets
+
+# punctuation is dropped inside words: "what's" -> "whats"
+_DROP_TABLE = str.maketrans("", "", string.punctuation)
+
+
+# Lowercase, remove punctuation, strip whitespace
+def normalize_text(text: str) -> str:
+    return text.lower().translate(_DROP_TABLE).strip()
+
+
+class Utterance:
+    """One user message, tokenized and normalized once for every stage of a chat turn.
+
+    `words` are the whitespace separated words without their punctuation, as
+    intents, days and keywords are matched; `corrected` is the same list after
+    spell correction, computed on first use. `tokens` split at punctuation
+    too and are never corrected, so city names reach the city index as
+    typed; `compact` is their concatenation and `offsets` the (start, end)
+    of each token in it. `typed_tokens` are the same tokens in their original
+    case, to tell "Nice" from "nice".
+    """
+
+    __slots__ = ("text", "lower", "words", "normalized", "tokens", "compact", "offsets", "_correct", "_corrected")
+
+    def __init__(self, text: str, correct=None):
+        self.text = text
+        self.lower = text.lower()
+        self.words = self.lower.translate(_DROP_TABLE).split()
+        self.normalized = " ".join(self.words)
+        self.tokens = split_words(self.lower)
+        self.compact = "".join(self.tokens)
+        self.offsets = word_offsets(self.tokens)
+        self._correct = correct
+        self._corrected = None
+
+    def __repr__(self):
+        return f"Utterance({self.text!r})"
+
+    # words after spell correction, the input words when there is no corrector
+    @property
+    def corrected(self):
+        if self._corrected is None:
+            correct = self._correct
+            self._corrected = [correct(w) for w in self.words] if correct else list(self.words)
+        return self._corrected
+
+    @property
+    def corrected_text(self):
+        return " ".join(self.corrected)
+
+    # tokens in their original case, the lowercase ones if casing changed how the text splits
+    @property
+    def typed_tokens(self):
+        typed = split_words(self.text, lower=False)
+        return typed if len(typed) == len(self.tokens) else self.tokens
@@ -1,13 +1,63 @@
 
+import asyncio
 import datetime
+import random
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 try:
     # Case 1: imported as a package: from WeatherBot.WeatherAPI import WeatherAPI
-    from WeatherBot.config import WEATHER_CODE_MAP
+    from WeatherBot import config
+    from WeatherBot.CityIndex import compact
+    from WeatherBot.ForecastCache import ForecastCache
+    from WeatherBot.ForecastRecord import HOURLY_VARIABLES, ForecastRecord
+    from WeatherBot.Metrics import METRICS
+    from WeatherBot.Prefetcher import Prefetcher
+    from WeatherBot.SingleFlight import SingleFlight
+    from WeatherBot.Transport import LiveTransport, make_transport
+    from WeatherBot.WeatherStore import WeatherStore
 except ImportError:
     # Case 2: run from inside WeatherBot/ as a plain script
-    from config import WEATHER_CODE_MAP
+    import config
+    from CityIndex import compact
+    from ForecastCache import ForecastCache
+    from ForecastRecord import HOURLY_VARIABLES, ForecastRecord
+    from Metrics import METRICS
+    from Prefetcher import Prefetcher
+    from SingleFlight import SingleFlight
+    from Transport import LiveTransport, make_transport
+    from WeatherStore import WeatherStore
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Answer to a weather question without a city or a position
+NO_CITY = "Which city? Name one, or share your location."
+
+
+# Session with a per-host connection pool and jittered exponential backoff retries
+def make_session(pool_size=10, pool_hosts=2, keep_alive=True, retries=3, backoff=0.3):
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        backoff_jitter=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    # pool_hosts: number of hosts kept pooled, pool_size: connections kept per host
+    adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
 
 class WeatherAPI:
     GEO_URL = "https://geocoding-api.open-meteo.com/v1/search"
@@ -30,6 +80,104 @@ class WeatherAPI:
         "tomorrow": 1,
     }
 
+    # decimals kept from lat/lon in forecast cache keys
+    CACHE_PRECISION = 2
+    # locations per bulk forecast request, keeps the query string to a sane length
+    BULK_CHUNK_SIZE = 50
+    BULK_GEOCODE_WORKERS = 8
+
+    def __init__(
+        self,
+        local_geocoding: bool = True,
+        gazetteer=None,
+        cache_ttl: float = 600,
+        cache_size: int = 256,
+        stale_ttl: float = 0,
+        prefetch_top: int = 0,
+        store_path=None,
+        pool_size: int | None = None,
+        pool_hosts: int = 2,
+        keep_alive: bool = True,
+        retries: int = 3,
+        backoff: float = 0.3,
+        geo_url: str | None = None,
+        forecast_url: str | None = None,
+        transport=None,
+    ):
+        # other endpoints, e.g. a local stub for benchmarks
+        if geo_url:
+            self.GEO_URL = geo_url
+        if forecast_url:
+            self.FORECAST_URL = forecast_url
+        # Resolve names from the gazetteer first, the geocoding API is only a fallback
+        self.local_geocoding = local_geocoding
+        self._gazetteer = gazetteer
+        # the shared config.CITY_RECORDS, unless a gazetteer of its own is passed in
+        self._shared_gazetteer = gazetteer is None
+        self._city_records = None
+        # 7 day forecasts by location, any day of the window is answered from here;
+        # up to stale_ttl seconds past expiry they are still served while a refresh runs
+        self.forecast_cache = ForecastCache(ttl=cache_ttl, maxsize=cache_size, stale_ttl=stale_ttl)
+        # names resolved by the geocoding API, coordinates do not change so they are kept a day
+        self.location_cache = ForecastCache(ttl=86400, maxsize=4096)
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        # keeps the forecasts of the most asked about cities from expiring, see Chatbot.extract_weather_query
+        self.prefetcher = Prefetcher(self, top=prefetch_top) if prefetch_top else None
+        # optional SQLite store shared by every worker process and kept across restarts
+        self.store = WeatherStore(store_path) if store_path else None
+        # pooled keep-alive session, only when pool_size is given; plain requests.get otherwise
+        self.session = make_session(pool_size, pool_hosts, keep_alive, retries, backoff) if pool_size else None
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        # how requests reach the API: live, or a transport instance / "record:<path>" / "replay:<path>"
+        live = LiveTransport(self.session, pool_size)
+        self.transport = transport if transport is not None and not isinstance(transport, str) \
+            else make_transport(transport, live)
+        # upstream calls currently running, shared by concurrent identical requests
+        self._inflight = SingleFlight()
+
+    @property
+    def gazetteer(self):
+        if self._gazetteer is None:
+            try:
+                self._gazetteer = config.GAZETTEER
+            except (OSError, ValueError):
+                # no gazetteer available: every lookup goes to the API
+                self.local_geocoding = False
+        return self._gazetteer
+
+    # compact name -> gazetteer record of the known cities; other names are left to the API
+    @property
+    def city_records(self):
+        if self._city_records is None:
+            gazetteer = self.gazetteer
+            if gazetteer is None:
+                return {}
+            self._city_records = config.CITY_RECORDS if self._shared_gazetteer \
+                else gazetteer.name_index(config.load_city_list(gazetteer))
+        return self._city_records
+
+    # Build the local geocoding table now, not in the first request that needs it
+    def preload(self):
+        if self.local_geocoding:
+            self.city_records
+
+    def _http_get(self, url, params):
+        endpoint = self._endpoint(url)
+        with METRICS.span(f"upstream_{endpoint}"):
+            try:
+                r = self.transport.get(url, params)
+            except Exception:
+                METRICS.inc("errors_total", stage=f"upstream_{endpoint}")
+                raise
+        METRICS.inc("upstream_requests_total", endpoint=endpoint, status=r.status_code)
+        return r
+
+    def _endpoint(self, url):
+        return "geocode" if url == self.GEO_URL else "forecast"
+
     # Get date from keyword
     def get_time(self, keyword: str | None) -> datetime.date:
         current_date = datetime.date.today()
@@ -56,14 +204,81 @@ class WeatherAPI:
         except ValueError:
             return current_date
 
+    # Get lat/lon from the gazetteer, None when the name is not one of the known cities
+    def geocode_local(self, city: str):
+        i = self.city_records.get(compact(city))
+        if i is None:
+            return None
+        gazetteer = self.gazetteer
+        lat, lon = gazetteer.coordinates(i)
+        return lat, lon, gazetteer.name(i)
+
     # Get lat/lon from city name
     def geocode_city(self, city: str):
-        params = {"name": city, "count": 1, "language": "en", "format": "json"}
+        if not city:
+            return None, None, NO_CITY
+        cached = self._known_location(city)
+        if cached is not None:
+            return cached
+
+        # concurrent lookups of the same name share one request
+        return self._inflight.do(("geocode", compact(city or "")), self._geocode_and_remember, city)
+
+    def _geocode_and_remember(self, city):
+        result = self.geocode_remote(city)
+        self._remember_location(city, result)
+        return result
+
+    # Local gazetteer, then names already resolved, then the shared store; None when the API has to be asked
+    def _known_location(self, city):
+        found = self._remembered_location(city)
+        if found is None:
+            found = self._stored_location(city)
+        return found
+
+    # Local gazetteer, then names already resolved, without touching the store
+    def _remembered_location(self, city):
+        if self.local_geocoding and city:
+            local = self.geocode_local(city)
+            if local is not None:
+                METRICS.inc("geocode_total", source="local")
+                return local
+
+        remembered = self.location_cache.get(compact(city or ""))
+        if remembered is not None:
+            METRICS.inc("geocode_total", source="memory")
+        return remembered
+
+    # The shared store, kept in memory once found there
+    def _stored_location(self, city):
+        if self.store is not None:
+            stored = self.store.get_geocode(compact(city or ""))
+            if stored is not None:
+                METRICS.inc("geocode_total", source="store")
+                self.location_cache.put(compact(city or ""), stored)
+                return stored
+        METRICS.inc("geocode_total", source="remote")
+        return None
+
+    def _remember_location(self, city, result):
+        if result[0] is None:
+            return
+        self.location_cache.put(compact(city or ""), result)
+        if self.store is not None:
+            self.store.put_geocode(compact(city or ""), *result)
+
+    # Get lat/lon from the Open-Meteo geocoding API
+    def geocode_remote(self, city: str):
         try:
-            r = requests.get(self.GEO_URL, params=params, timeout=5)
+            r = self._http_get(self.GEO_URL, self._geocode_params(city))
         except Exception as e:
             return None, None, f"Geocoding error: {e}"
+        return self._parse_geocode(r, city)
+
+    def _geocode_params(self, city):
+        return {"name": city, "count": 1, "language": "en", "format": "json"}
 
+    def _parse_geocode(self, r, city):
         if r.status_code != 200:
             return None, None, f"Geocoding HTTP error: {r.status_code}"
 
@@ -76,16 +291,122 @@ class WeatherAPI:
         return first["latitude"], first["longitude"], first["name"]
 
 	# Get weather data
-    def get_weather(self, city: str, time_keyword: str | None = None) -> dict:
+    # hours: (start, end) hours of the day to also summarize, e.g. (17, 18) for "at 5pm"
+    # coords: (lat, lon) when already known, e.g. the position of the user; skips geocoding
+    def get_weather(self, city: str, time_keyword: str | None = None, hours=None, coords=None) -> Mapping:
         
 		# Find the date corresponding to time_keyword
         target_date = self.get_time(time_keyword)
 
-        lat, lon, resolved_name_or_error = self.geocode_city(city)
+        with METRICS.span("geocode"):
+            lat, lon, resolved_name_or_error = (*coords, city) if coords else self.geocode_city(city)
         if lat is None:
+            METRICS.inc("errors_total", stage="geocode")
             return {"error": resolved_name_or_error}  # error message
 
-        params = {
+        with METRICS.span("forecast"):
+            data = self.get_forecast(lat, lon)
+        if isinstance(data, dict):  # error message
+            METRICS.inc("errors_total", stage="forecast")
+            return data
+
+        return self.weather_for_day(data, target_date, resolved_name_or_error, time_keyword, hours)
+
+    # Cache key: coordinates rounded to ~1 km, forecasts do not differ below that
+    def location_key(self, lat: float, lon: float):
+        return round(lat, self.CACHE_PRECISION), round(lon, self.CACHE_PRECISION)
+
+    # Full 7 day forecast payload for a location, from the cache when possible
+    def get_forecast(self, lat: float, lon: float) -> ForecastRecord | dict:
+        key = self.location_key(lat, lon)
+        data = self._cached_forecast(key, lat, lon)
+        if data is not None:
+            return data
+
+        # concurrent misses for the same location share one request
+        return self._inflight.do(("forecast", key), self._fetch_and_remember, key, lat, lon)
+
+    def _fetch_and_remember(self, key, lat, lon):
+        data = self.fetch_forecast(lat, lon)
+        self._remember_forecast(key, data)
+        return data
+
+    # Memory cache, then the shared store. A stale payload is returned as is
+    # and refreshed in the background.
+    def _cached_forecast(self, key, lat, lon):
+        data = self._remembered_forecast(key, lat, lon)
+        if data is None:
+            data = self._stored_forecast(key)
+        return data
+
+    # Memory cache only, None on a miss
+    def _remembered_forecast(self, key, lat, lon):
+        data, age = self.forecast_cache.get_stale(key)
+        if data is None:
+            return None
+        source = "memory"
+        if age >= self.forecast_cache.ttl:
+            source = "stale"
+            self.refresh_in_background(key, lat, lon)
+        METRICS.inc("forecast_cache_total", result=source)
+        return data
+
+    # The shared store, kept in memory once found there
+    def _stored_forecast(self, key):
+        stored = self.store.get_forecast(key) if self.store is not None else None
+        if stored is None:
+            METRICS.inc("forecast_cache_total", result="miss")
+            return None
+        payload, remaining = stored
+        data = ForecastRecord.from_payload(payload)
+        # expires when the stored copy does, not a full ttl from now
+        self.forecast_cache.put(key, data, age=max(0.0, self.forecast_cache.ttl - remaining))
+        METRICS.inc("forecast_cache_total", result="store")
+        return data
+
+    # Refetch a forecast on a daemon thread, at most one refresh per location at a time
+    def refresh_in_background(self, key, lat, lon):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._inflight.do(("forecast", key), self._fetch_and_remember, key, lat, lon)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="forecast-refresh", daemon=True).start()
+
+    # Fetch and cache the forecasts of many locations in bulk requests, cached or not
+    def refresh_forecasts(self, coords) -> dict:
+        pending = list({self.location_key(lat, lon): (lat, lon) for lat, lon in coords}.items())
+        payloads = {}
+        for start in range(0, len(pending), self.BULK_CHUNK_SIZE):
+            chunk = pending[start:start + self.BULK_CHUNK_SIZE]
+            fetched = self.fetch_forecasts([coords for _, coords in chunk])
+            for (key, _), data in zip(chunk, fetched):
+                self._remember_forecast(key, data)
+                payloads[key] = data
+        return payloads
+
+    def _remember_forecast(self, key, data):
+        if isinstance(data, ForecastRecord):
+            self.forecast_cache.put(key, data)
+            if self.store is not None:
+                self.store.put_forecast(key, data.to_payload(), self.forecast_cache.ttl)
+
+    def fetch_forecast(self, lat: float, lon: float) -> ForecastRecord | dict:
+        try:
+            r = self._http_get(self.FORECAST_URL, self._forecast_params(lat, lon))
+        except Exception as e:
+            return {"error": f"Weather API connection error: {e}"}
+        return self._parse_forecast(r)
+
+    def _forecast_params(self, lat, lon):
+        return {
             "latitude": lat,
             "longitude": lon,
             "current_weather": True,
@@ -93,62 +414,194 @@ class WeatherAPI:
                 "weathercode,temperature_2m_max,temperature_2m_min,"
                 "sunrise,sunset,windspeed_10m_max"
             ),
+            # the 168 hourly points come with the daily ones, no second request is ever needed
+            "hourly": HOURLY_VARIABLES,
             "forecast_days": 7,
             "timezone": "auto",
         }
 
-        try:
-            r = requests.get(self.FORECAST_URL, params=params, timeout=5)
-        except Exception as e:
-            return {"error": f"Weather API connection error: {e}"}
-
+    def _parse_forecast(self, r):
         if r.status_code != 200:
             return {"error": f"Weather API HTTP error: {r.status_code}"}
 
-        data = r.json()
+        return self._check_forecast(r.json())
+
+    def _check_forecast(self, data):
         daily = data.get("daily")
         if not daily:
             return {"error": "No daily weather data available."}
 
-        # choose correct day index
-        dates_str = daily.get("time", [])
-        if not dates_str:
+        if not daily.get("time"):
             return {"error": "Missing dates in weather data."}
 
-        dates = [datetime.date.fromisoformat(ds) for ds in dates_str]
         try:
-            idx = dates.index(target_date)
-        except ValueError:
-            # if requested date is outside forecast, choose closest
-            diffs = [abs((d - target_date).days) for d in dates]
-            idx = diffs.index(min(diffs))
+            return ForecastRecord.from_payload(data)
+        except (KeyError, IndexError, TypeError, ValueError, OverflowError):
+            return {"error": "Malformed weather data."}
 
-        code = daily["weathercode"][idx]
-        description = WEATHER_CODE_MAP.get(code, "Unknown weather")
+    # Weather for many cities on one day, keyed by the given city names.
+    # Forecasts missing from the caches are fetched in batched requests.
+    # coords: {city: (lat, lon)} for the names that need no geocoding
+    def get_weather_many(self, cities, time_keyword: str | None = None, hours=None, coords=None) -> dict:
+        target_date = self.get_time(time_keyword)
 
-        temp_max = daily["temperature_2m_max"][idx]
-        temp_min = daily["temperature_2m_min"][idx]
-        wind = daily["windspeed_10m_max"][idx]
-        sunrise = daily["sunrise"][idx]
-        sunset = daily["sunset"][idx]
-        chosen_date = dates[idx].isoformat()
+        coords = coords or {}
+        names = [city for city in dict.fromkeys(cities) if city not in coords]
+        with METRICS.span("geocode"):
+            if len(names) > 1:
+                # names missing from the gazetteer and store are geocoded in parallel
+                with ThreadPoolExecutor(max_workers=min(len(names), self.BULK_GEOCODE_WORKERS)) as pool:
+                    located = dict(zip(names, pool.map(self.geocode_city, names)))
+            else:
+                located = {city: self.geocode_city(city) for city in names}
+        located.update((city, (*coords[city], city)) for city in cities if city in coords)
 
-        cw = data.get("current_weather")
-        current_temp = cw["temperature"] if cw and idx == 0 else None
-        current_wind = cw["windspeed"] if cw and idx == 0 else None
+        payloads = {}
+        missing = {}
+        for lat, lon, _ in located.values():
+            if lat is None:
+                continue
+            key = self.location_key(lat, lon)
+            if key in payloads or key in missing:
+                continue
+            data = self._cached_forecast(key, lat, lon)
+            if data is not None:
+                payloads[key] = data
+            else:
+                missing[key] = (lat, lon)
 
-        return {
-            "status": "ok",
-            "city": resolved_name_or_error,
-            "requested_keyword": time_keyword,
-            "date": chosen_date,
-            "description": description,
-            "weathercode": code,
-            "temp_max": temp_max,
-            "temp_min": temp_min,
-            "daily_wind": wind,
-            "sunrise": sunrise,
-            "sunset": sunset,
-            "current_temp": current_temp,
-            "current_wind": current_wind,
-        }
\ No newline at end of file
+        with METRICS.span("forecast"):
+            payloads.update(self.refresh_forecasts(missing.values()))
+
+        results = {}
+        for city, (lat, lon, resolved_name_or_error) in located.items():
+            if lat is None:
+                results[city] = {"error": resolved_name_or_error}
+                continue
+            data = payloads[self.location_key(lat, lon)]
+            if isinstance(data, dict):  # error message
+                results[city] = data
+            else:
+                results[city] = self.weather_for_day(data, target_date, resolved_name_or_error, time_keyword, hours)
+        return results
+
+    # One upstream request for several locations, one payload (or error) per location
+    def fetch_forecasts(self, coords) -> list:
+        if len(coords) == 1:
+            return [self.fetch_forecast(*coords[0])]
+
+        params = self._forecast_params(
+            ",".join(str(lat) for lat, _ in coords),
+            ",".join(str(lon) for _, lon in coords),
+        )
+        try:
+            r = self._http_get(self.FORECAST_URL, params)
+        except Exception as e:
+            return [{"error": f"Weather API connection error: {e}"}] * len(coords)
+
+        if r.status_code != 200:
+            return [{"error": f"Weather API HTTP error: {r.status_code}"}] * len(coords)
+
+        # Open-Meteo answers a list, in request order, when given several locations
+        data = r.json()
+        if not isinstance(data, list) or len(data) != len(coords):
+            return [{"error": "Unexpected bulk weather response."}] * len(coords)
+        return [self._check_forecast(item) for item in data]
+
+    # Async versions of the calls above, sharing their caches, store and parsing.
+    # Call preload() before serving, the lookup tables are not built on the event loop.
+    async def ageocode_city(self, city: str):
+        if not city:
+            return None, None, NO_CITY
+        cached = self._remembered_location(city)
+        if cached is None:
+            cached = await self._off_loop(self._stored_location, city)
+        if cached is not None:
+            return cached
+
+        return await self._inflight.ado(("geocode", compact(city or "")), self._ageocode_and_remember, city)
+
+    async def _ageocode_and_remember(self, city):
+        result = await self.ageocode_remote(city)
+        await self._off_loop(self._remember_location, city, result)
+        return result
+
+    # Run a call that reads or writes the SQLite store in a thread: it can wait
+    # seconds for another process's write lock. Inline when there is no store.
+    async def _off_loop(self, fn, *args):
+        if self.store is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def ageocode_remote(self, city: str):
+        try:
+            r = await self._ahttp_get(self.GEO_URL, self._geocode_params(city))
+        except Exception as e:
+            return None, None, f"Geocoding error: {e}"
+        return self._parse_geocode(r, city)
+
+    async def aget_weather(self, city: str, time_keyword: str | None = None, hours=None, coords=None) -> Mapping:
+        target_date = self.get_time(time_keyword)
+
+        with METRICS.span("geocode"):
+            lat, lon, resolved_name_or_error = (*coords, city) if coords else await self.ageocode_city(city)
+        if lat is None:
+            METRICS.inc("errors_total", stage="geocode")
+            return {"error": resolved_name_or_error}  # error message
+
+        with METRICS.span("forecast"):
+            data = await self.aget_forecast(lat, lon)
+        if isinstance(data, dict):  # error message
+            METRICS.inc("errors_total", stage="forecast")
+            return data
+
+        return self.weather_for_day(data, target_date, resolved_name_or_error, time_keyword, hours)
+
+    async def aget_forecast(self, lat: float, lon: float) -> ForecastRecord | dict:
+        key = self.location_key(lat, lon)
+        data = self._remembered_forecast(key, lat, lon)
+        if data is None:
+            data = await self._off_loop(self._stored_forecast, key)
+        if data is not None:
+            return data
+
+        return await self._inflight.ado(("forecast", key), self._afetch_and_remember, key, lat, lon)
+
+    async def _afetch_and_remember(self, key, lat, lon):
+        data = await self.afetch_forecast(lat, lon)
+        await self._off_loop(self._remember_forecast, key, data)
+        return data
+
+    async def afetch_forecast(self, lat: float, lon: float) -> ForecastRecord | dict:
+        try:
+            r = await self._ahttp_get(self.FORECAST_URL, self._forecast_params(lat, lon))
+        except Exception as e:
+            return {"error": f"Weather API connection error: {e}"}
+        return self._parse_forecast(r)
+
+    # Same retry policy as the pooled session: jittered exponential backoff on 429/5xx
+    async def _ahttp_get(self, url, params):
+        endpoint = self._endpoint(url)
+        for attempt in range(self.retries + 1):
+            with METRICS.span(f"upstream_{endpoint}"):
+                try:
+                    r = await self.transport.aget(url, params)
+                except Exception:
+                    METRICS.inc("errors_total", stage=f"upstream_{endpoint}")
+                    raise
+            METRICS.inc("upstream_requests_total", endpoint=endpoint, status=r.status_code)
+            if r.status_code not in RETRY_STATUSES or attempt == self.retries:
+                return r
+            await asyncio.sleep(self.backoff * 2 ** attempt + random.uniform(0, self.backoff))
+
+    def close(self):
+        self.transport.close()
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    # Pick one day out of a forecast, a ForecastRecord or a raw payload
+    def weather_for_day(self, data, target_date: datetime.date, city: str, time_keyword: str | None, hours=None):
+        if not isinstance(data, ForecastRecord):
+            data = ForecastRecord.from_payload(data)
+        return data.day(target_date, city, time_keyword, hours)
@@ -0,0 +1,79 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class WeatherStore:
+    """SQLite backed store for geocoding results and forecast payloads.
+
+    The database runs in WAL mode so any number of processes can read it
+    while one of them writes, and it survives restarts. Each thread (and
+    each forked process) opens its own connection.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS geocode (
+        name TEXT PRIMARY KEY,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        resolved TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS forecast (
+        location TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        expires REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = str(path)
+        self._clock = clock
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        # connections must not cross a fork, so they are keyed by pid too
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_geocode(self, name: str):
+        row = self._conn().execute(
+            "SELECT latitude, longitude, resolved FROM geocode WHERE name = ?", (name,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def put_geocode(self, name: str, lat: float, lon: float, resolved: str):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO geocode (name, latitude, longitude, resolved) VALUES (?, ?, ?, ?)",
+            (name, lat, lon, resolved),
+        )
+
+    # (forecast payload, seconds until it expires) for a location key, None when missing or expired
+    def get_forecast(self, location):
+        now = self._clock()
+        row = self._conn().execute(
+            "SELECT payload, expires FROM forecast WHERE location = ? AND expires > ?",
+            (self._location(location), now),
+        ).fetchone()
+        return (json.loads(row[0]), row[1] - now) if row else None
+
+    def put_forecast(self, location, payload: dict, ttl: float):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO forecast (location, payload, expires) VALUES (?, ?, ?)",
+            (self._location(location), json.dumps(payload, separators=(",", ":")), self._clock() + ttl),
+        )
+
+    def purge_expired(self):
+        self._conn().execute("DELETE FROM forecast WHERE expires <= ?", (self._clock(),))
+
+    @staticmethod
+    def _location(location):
+        return ",".join(str(part) for part in location)
@@ -0,0 +1,150 @@
+# Offline batch mode: run a JSONL file of utterances through the NLP stages of the bot.
+#
+#   python batch.py logs.jsonl results.jsonl --workers 8
+#   zcat logs.jsonl.gz | python batch.py - - --live > answers.jsonl
+#
+# Each input line is a JSON object with a "message" field (see --field) or a
+# bare JSON string. Every output line is the input object plus what the bot
+# understood: normalized and spell corrected text, intent, cities, dates, hours
+# and keywords. Forecasts are only fetched with --live, which adds the "response".
+# A line that cannot be analyzed keeps its input fields and gets "line" and "error".
+#
+# Lines go to a process pool in chunks. The chat resources, lazily built city
+# tables included, are built once before the pool forks, so the workers share
+# them. At most --window chunks are in flight, and results are written in
+# input order as soon as they are ready, so memory stays bounded whatever the
+# size of the file.
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, deque
+from itertools import islice
+
+from ChatBot import Chatbot, ChatResources
+
+# Set in the parent before forking, or by _init_worker where fork is not available
+_resources = None
+
+
+def _init_worker():
+    global _resources
+    if _resources is None:
+        _resources = ChatResources.shared()
+
+
+# What the bot makes of one message, without the conversation state of a session
+def analyze(resources, message, live=False):
+    bot = Chatbot(resources)
+    utterance = bot.parse(message)
+    result = {
+        "normalized": utterance.normalized,
+        "corrected": utterance.corrected_text,
+        "intent": bot.detect_intent(utterance),
+        "city": bot.extract_cities(utterance),
+        "cities": bot.extract_all_cities(utterance),
+        "date": bot.extract_date(utterance),
+        "dates": bot.extract_dates(utterance),
+        "hours": bot.extract_time(utterance),
+        "keywords": bot.extract_keywords(utterance),
+    }
+    if live:
+        result["response"], _ = Chatbot(resources).chat(message)
+    return result
+
+
+# (ok, output line) for every input line of a chunk
+def process_chunk(lines, field="message", live=False):
+    out = []
+    for lineno, line in lines:
+        record = None
+        try:
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {field: record}
+            message = record.get(field) if isinstance(record, dict) else None
+            if not isinstance(message, str):
+                raise ValueError(f"no {field!r} string")
+            record.update(analyze(_resources, message, live))
+            ok = True
+        except Exception as e:
+            fields = record if isinstance(record, dict) else {}
+            record = {**fields, "line": lineno, "error": f"{type(e).__name__}: {e}"}
+            ok = False
+        out.append((ok, json.dumps(record, ensure_ascii=False)))
+    return out
+
+
+def read_chunks(f, size):
+    numbered = ((n, line) for n, line in enumerate(f, 1) if line.strip())
+    while True:
+        chunk = list(islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run(src, dst, workers=None, chunksize=256, window=None, field="message", live=False):
+    global _resources
+    workers = workers or os.cpu_count() or 1
+    window = window or 2 * workers
+    _resources = ChatResources.shared()
+    stats = Counter()
+
+    def write(results):
+        for ok, line in results:
+            dst.write(line + "\n")
+            stats["ok" if ok else "errors"] += 1
+
+    if workers == 1:
+        for chunk in read_chunks(src, chunksize):
+            write(process_chunk(chunk, field, live))
+        return stats
+
+    # the typo fallback's city lookup and, with --live, the geocoding table, which would
+    # otherwise be built again by every worker
+    _resources.preload(geocoding=live)
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with ctx.Pool(workers, initializer=_init_worker) as pool:
+        in_flight = deque()
+        for chunk in read_chunks(src, chunksize):
+            in_flight.append(pool.apply_async(process_chunk, (chunk, field, live)))
+            if len(in_flight) >= window:
+                write(in_flight.popleft().get())
+        while in_flight:
+            write(in_flight.popleft().get())
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of utterances through the bot")
+    parser.add_argument("input", help="JSONL file, - for stdin")
+    parser.add_argument("output", help="JSONL file, - for stdout")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count, 1 runs inline)")
+    parser.add_argument("--chunksize", type=int, default=256, help="lines per task")
+    parser.add_argument("--window", type=int, default=None, help="chunks in flight (default: 2 x workers)")
+    parser.add_argument("--field", default="message", help="field holding the utterance")
+    parser.add_argument("--live", action="store_true", help="also answer with chat(), fetching forecasts")
+    args = parser.parse_args()
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    start = time.perf_counter()
+    try:
+        stats = run(src, dst, args.workers, args.chunksize, args.window, args.field, args.live)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    elapsed = time.perf_counter() - start
+    total = stats["ok"] + stats["errors"]
+    print(f"{total} lines ({stats['errors']} errors) in {elapsed:.1f} s, {total / elapsed:.0f} lines/s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Time ChatResources() with the prebuilt keywords file against the WordNet expansion.
+
+Run from the repository root (keywords.json ships with the code, see build_keywords.py):
+    python benchmarks/bench_cold_start.py
+Each measurement runs in a fresh interpreter so WordNet is loaded cold.
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SNIPPET = """
+import time
+start = time.perf_counter()
+from ChatBot import ChatResources, KEYWORDS_FILE
+imported = time.perf_counter()
+ChatResources(keywords_path={path})
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def run(path_expr):
+    out = subprocess.run(
+        [sys.executable, "-c", SNIPPET.format(path=path_expr)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    return float(out[0]), float(out[1])
+
+
+def main(repeat=3):
+    if not (ROOT / "keywords.json").exists():
+        raise SystemExit("keywords.json is missing, run `python build_keywords.py` first")
+
+    for label, path_expr in (("prebuilt", "KEYWORDS_FILE"), ("wordnet", "None")):
+        runs = [run(path_expr) for _ in range(repeat)]
+        init = min(r[1] for r in runs)
+        print(f"{label:9s} import {min(r[0] for r in runs) * 1000:8.1f} ms   resources {init * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Compare the regex intent matcher with the combined IntentMatcher.
+
+Run from the repository root:  python benchmarks/bench_intents.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ChatBot import Chatbot  # noqa: E402
+
+MESSAGES = [
+    "hello",
+    "how are you",
+    "what is the weather in paris tomorrow",
+    "is it going to rain in lyon on friday",
+    "thanks a lot",
+    "see you later",
+    "what is your name",
+    "tell me something",
+    # long pasted message with no keyword until the very end
+    " ".join(["lorem ipsum dolor sit amet"] * 80) + " forecast",
+    " ".join(["lorem ipsum dolor sit amet"] * 80),
+]
+
+
+def main(number=200):
+    bot = Chatbot()
+    messages = [bot.normalize(m) for m in MESSAGES]
+
+    for m in messages:
+        old, new = bot.match_patterns_regex(m), bot.intent_matcher.match(m)
+        if old != new:
+            raise SystemExit(f"mismatch on {m[:40]!r}: regex={old} matcher={new}")
+
+    for label, fn in (("regex", bot.match_patterns_regex), ("matcher", bot.intent_matcher.match)):
+        elapsed = timeit.timeit(lambda: [fn(m) for m in messages], number=number)
+        per_msg = elapsed / (number * len(messages)) * 1e6
+        print(f"{label:8s} {per_msg:10.1f} us/message")
+
+
+if __name__ == "__main__":
+    main()
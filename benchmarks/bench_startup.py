@@ -0,0 +1,66 @@
+"""Startup time and peak memory of loading the city list, pandas vs gazetteer.
+
+Run from the repository root with cities1000.txt present:
+    python benchmarks/bench_startup.py
+Each loader runs in a fresh interpreter; memory is the peak resident set size.
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# What config.py did at import time before the gazetteer existed
+PANDAS = """
+import pandas as pd
+df = pd.read_csv(
+    "cities1000.txt", sep="\\t", header=None, low_memory=False,
+    names=[
+        "geonameid","name","asciiname","alternatenames","latitude","longitude",
+        "feature class","feature code","country code","cc2","admin1","admin2",
+        "admin3","admin4","population","elevation","dem","timezone","modification date"
+    ],
+)
+df.sort_values("population", ascending=False, inplace=True)
+top = df["name"].dropna().unique().tolist()[:1000]
+fr = df[df["country code"] == "FR"]["name"].dropna().unique().tolist()
+cities = [c for c in [*top, *fr] if len(c) >= 4]
+"""
+
+GAZETTEER = """
+import config
+cities = config.KNOWN_CITIES
+"""
+
+MEASURE = """
+import time, resource
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, len(cities))
+"""
+
+
+def run(code):
+    out = subprocess.run(
+        [sys.executable, "-c", MEASURE.format(code=code)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    return float(out[0]), int(out[1]), int(out[2])
+
+
+def main(repeat=3):
+    if not (ROOT / "cities1000.txt").exists():
+        raise SystemExit("cities1000.txt is missing")
+    # build cities.gaz once so the gazetteer runs measure loading only
+    run(GAZETTEER)
+
+    for label, code in (("pandas", PANDAS), ("gazetteer", GAZETTEER)):
+        runs = [run(code) for _ in range(repeat)]
+        elapsed = min(r[0] for r in runs)
+        rss = min(r[1] for r in runs)
+        print(f"{label:10s} {elapsed * 1000:8.1f} ms  peak RSS {rss / 1024:7.1f} MiB  {runs[0][2]} cities")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Utterance corpus for the chat pipeline benchmarks, grouped by kind."""
+
+GREETINGS = [
+    "hello",
+    "hi there!",
+    "hey, how are you?",
+    "how is it going",
+    "thanks a lot",
+    "thank you so much",
+    "bye, see you later",
+    "what is your name?",
+    "who are you",
+    "you are stupid",
+]
+
+WEATHER = [
+    "What's the weather in Paris today?",
+    "Will it be hot in New York tomorrow?",
+    "When is sunrise in Tokyo on Friday?",
+    "Is it going to rain in Berlin today?",
+    "What's the temperature in London?",
+    "How windy is it in Chicago tomorrow?",
+    "sunset in Marseille on sunday",
+    "forecast for Lyon this weekend",
+    "weather in Toulouse for the next 3 days",
+    "is it cold in Reykjavik?",
+    "temperature in Nairobi on monday",
+    "rain in Lima tomorrow?",
+]
+
+MISSPELLINGS = [
+    "helo",
+    "wheather in paris tommorow",
+    "waht is the temprature in lyon",
+    "forcast for berlin on fridy",
+    "is it windi in marseile",
+    "thnks",
+    "sunrse in tokyo",
+    "how r you",
+]
+
+MULTI_CITY = [
+    "weather in Paris, Lyon and Marseille",
+    "compare Berlin, Vienna, Prague and Copenhagen tomorrow",
+    "temperature in Madrid and Rome this weekend",
+    "weather in Amsterdam, Brussels, Stockholm, Oslo and Helsinki",
+    "Nantes Rennes Angers Le Havre Grenoble Dijon forecast",
+]
+
+LONG = [
+    " ".join(["I was wondering, because we are planning a long trip with the whole family,"] * 15)
+    + " what the weather will be like in Bordeaux on saturday",
+    " ".join(["lorem ipsum dolor sit amet consectetur adipiscing elit"] * 40),
+    " ".join(["paris lyon nice"] * 30) + " weather",
+]
+
+ALL = GREETINGS + WEATHER + MISSPELLINGS + MULTI_CITY + LONG
+
+# Words fed one by one to correct_spelling
+WORDS = sorted({w.strip("?,!.").lower() for text in GREETINGS + WEATHER + MISSPELLINGS for w in text.split()})
+
+# City names with one or two typos, fed to CityResolver.candidates
+MISSPELT_CITIES = [
+    "Pariss",
+    "Berln",
+    "Lodnon",
+    "Madird",
+    "Toulouze",
+    "Marseile",
+    "Amsterdm",
+    "Stokholm",
+    "saint etiene",
+    "Montpelier",
+    "Strasbour",
+    "Bordaux",
+]
+
+# (lat, lon) of users asking about "here", fed to CityLocator.nearest
+POSITIONS = [
+    (48.8566, 2.3522),
+    (45.7640, 4.8357),
+    (40.7128, -74.0060),
+    (35.6762, 139.6503),
+    (-33.8688, 151.2093),
+    (64.1466, -21.9426),
+    (0.0, -160.0),
+    (71.0, 179.9),
+]
+
+# (city, day keyword) pairs fed to WeatherAPI.get_weather
+WEATHER_QUERIES = [
+    ("Paris", "today"),
+    ("Lyon", "tomorrow"),
+    ("Berlin", "friday"),
+    ("Tokyo", None),
+    ("Reykjavik", "monday"),
+    ("Nairobi", "today"),
+]
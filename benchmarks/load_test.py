@@ -0,0 +1,138 @@
+"""Load test for the HTTP chat service (server.py).
+
+Opens --concurrency keep-alive connections and sends chat messages from the
+benchmark corpus for --duration seconds, then reports requests per second,
+latency percentiles and the count of each status code (503s show the
+backpressure at work):
+
+    python server.py --workers 4 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8080 --concurrency 32
+
+With --self-host the service runs in this process, on top of the Open-Meteo
+stub and the sample gazetteer, so the numbers do not depend on the network.
+"""
+import argparse
+import http.client
+import json
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+
+import corpus  # noqa: E402
+from run import percentile  # noqa: E402
+
+
+def worker(host, port, path, stop_at, batch, results, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    latencies, statuses = [], Counter()
+    i = 0
+    while time.perf_counter() < stop_at:
+        if batch:
+            body = {"messages": [corpus.ALL[(i + k) % len(corpus.ALL)] for k in range(batch)]}
+        else:
+            body = {"message": corpus.ALL[i % len(corpus.ALL)]}
+        i += batch or 1
+        payload = json.dumps(body)
+        start = time.perf_counter()
+        try:
+            conn.request("POST", path, payload, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            if response.getheader("Connection", "").lower() == "close":
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            status = "error"
+            conn.close()
+        latencies.append(time.perf_counter() - start)
+        statuses[status] += 1
+    conn.close()
+    with lock:
+        results["latencies"].extend(latencies)
+        results["statuses"].update(statuses)
+
+
+def load(url, concurrency, duration, batch):
+    parts = urlsplit(url)
+    path = "/chat/batch" if batch else "/chat"
+    results = {"latencies": [], "statuses": Counter()}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=worker, args=(parts.hostname, parts.port or 80, path, stop_at, batch, results, lock))
+        for _ in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def self_hosted(args):
+    from stub_server import OpenMeteoStub
+    from run import use_gazetteer
+    from ChatBot import ChatResources
+    from WeatherAPI import WeatherAPI
+    from server import ChatServer, ChatService
+
+    tmpdir = tempfile.TemporaryDirectory()
+    stub = OpenMeteoStub(latency=args.latency_ms / 1000).start()
+    use_gazetteer("sample", tmpdir.name)
+    api = WeatherAPI(geo_url=stub.geo_url, forecast_url=stub.forecast_url, pool_size=args.threads)
+    service = ChatService(ChatResources(weather_api=api), threads=args.threads, max_pending=args.max_pending)
+    server = ChatServer(("127.0.0.1", 0), service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def close():
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
+        stub.stop()
+        tmpdir.cleanup()
+
+    return f"http://127.0.0.1:{server.server_address[1]}", close
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the WeatherBot HTTP service")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--batch", type=int, default=0, help="messages per /chat/batch request, 0 uses /chat")
+    parser.add_argument("--self-host", action="store_true", help="run server and Open-Meteo stub in process")
+    parser.add_argument("--threads", type=int, default=16, help="chat threads (--self-host)")
+    parser.add_argument("--max-pending", type=int, default=64, help="pending budget (--self-host)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub latency (--self-host)")
+    args = parser.parse_args()
+
+    url, close = self_hosted(args) if args.self_host else (args.url, None)
+    try:
+        results, elapsed = load(url, args.concurrency, args.duration, args.batch)
+    finally:
+        if close:
+            close()
+
+    latencies = sorted(results["latencies"])
+    statuses = results["statuses"]
+    ok = statuses.get(200, 0)
+    messages = ok * (args.batch or 1)
+    print(f"{url}  concurrency {args.concurrency}  {elapsed:.1f} s")
+    print(f"requests {len(latencies)}  ({len(latencies) / elapsed:.1f} req/s, {ok / elapsed:.1f} ok/s, "
+          f"{messages / elapsed:.1f} messages/s)")
+    print(f"latency p50 {percentile(latencies, 50) * 1000:.2f} ms  p95 {percentile(latencies, 95) * 1000:.2f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:.2f} ms")
+    print("status  " + "  ".join(f"{code}: {n}" for code, n in sorted(statuses.items(), key=str)))
+
+
+if __name__ == "__main__":
+    main()
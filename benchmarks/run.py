@@ -0,0 +1,172 @@
+"""Benchmark suite for the chat pipeline, run offline against a local Open-Meteo stub.
+
+Measures throughput and p50/p95/p99 latency of Chatbot.chat, match_patterns,
+extract_cities, CityResolver.candidates, CityLocator.nearest,
+correct_spelling and WeatherAPI.get_weather, saves the
+results as JSON under benchmarks/results/ and can compare them with an
+earlier run:
+
+    python benchmarks/run.py
+    python benchmarks/run.py --latency-ms 40 --compare benchmarks/results/<old>.json
+
+The city list is the small fixture gazetteer unless --gazetteer full is
+given (which needs cities1000.txt or cities.gaz). Intent keywords come from
+keywords.json, see build_keywords.py; when it is missing or stale the
+unexpanded BASE_KEYWORDS are used, WordNet is never loaded.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parent
+sys.path.insert(0, str(ROOT))
+
+import corpus  # noqa: E402
+from stub_server import FIXTURES, OpenMeteoStub  # noqa: E402
+
+import config  # noqa: E402
+from ChatBot import BASE_KEYWORDS, KEYWORDS_FILE, Chatbot, ChatResources, load_keywords, save_keywords  # noqa: E402
+from WeatherAPI import WeatherAPI  # noqa: E402
+
+RESULTS = HERE / "results"
+
+
+def percentile(sorted_samples, p):
+    if not sorted_samples:
+        return 0.0
+    k = max(0, min(len(sorted_samples) - 1, round(p / 100 * len(sorted_samples) + 0.5) - 1))
+    return sorted_samples[k]
+
+
+# Call fn on every input, `rounds` times; `before_round` runs untimed between rounds
+def bench(fn, inputs, rounds, before_round=None):
+    samples = []
+    for _ in range(rounds):
+        if before_round:
+            before_round()
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            samples.append(time.perf_counter() - start)
+    samples.sort()
+    total = sum(samples)
+    return {
+        "calls": len(samples),
+        "throughput_per_s": len(samples) / total if total else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "mean_ms": total / len(samples) * 1000 if samples else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def use_gazetteer(kind, tmpdir):
+    if kind == "full":
+        return str(config.GAZETTEER_FILE)
+    path = Path(tmpdir) / "cities_sample.gaz"
+    config.GAZETTEER = config.load_gazetteer(path, FIXTURES / "cities_sample.txt")
+    return "sample"
+
+
+# keywords.json, or the unexpanded base keywords where it is missing or out of date
+def use_keywords(tmpdir):
+    if load_keywords() is not None:
+        return KEYWORDS_FILE, "prebuilt"
+    path = Path(tmpdir) / "keywords_base.json"
+    save_keywords({intent: set(kw_list) for intent, kw_list in BASE_KEYWORDS.items()}, path)
+    return path, "base"
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmpdir, OpenMeteoStub(latency=args.latency_ms / 1000) as stub:
+        gazetteer = use_gazetteer(args.gazetteer, tmpdir)
+        keywords_path, keywords = use_keywords(tmpdir)
+        api = WeatherAPI(geo_url=stub.geo_url, forecast_url=stub.forecast_url, pool_size=10)
+        resources = ChatResources(keywords_path, weather_api=api)
+        bot = Chatbot(resources)
+
+        def cold_caches():
+            api.forecast_cache.clear()
+            api.location_cache.clear()
+            resources.spell_engine.correct.cache_clear()
+
+        rounds = args.rounds
+        results = {
+            "match_patterns": bench(bot.match_patterns, corpus.ALL, rounds),
+            "extract_cities": bench(bot.extract_cities, corpus.ALL, rounds),
+            "resolve_city": bench(config.CITY_RESOLVER.candidates, corpus.MISSPELT_CITIES, rounds),
+            "locate_city": bench(lambda p: config.CITY_LOCATOR.nearest(*p), corpus.POSITIONS, rounds),
+            "correct_spelling": bench(bot.correct_spelling, corpus.WORDS, rounds, cold_caches),
+            "get_weather_cold": bench(lambda q: api.get_weather(*q), corpus.WEATHER_QUERIES, rounds, cold_caches),
+            "get_weather_warm": bench(lambda q: api.get_weather(*q), corpus.WEATHER_QUERIES, rounds),
+            "chat": bench(lambda text: Chatbot(resources).chat(text), corpus.ALL, rounds, cold_caches),
+        }
+        upstream = stub.requests
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rounds": args.rounds,
+            "latency_ms": args.latency_ms,
+            "gazetteer": gazetteer,
+            "keywords": keywords,
+            "known_cities": len(config.KNOWN_CITIES),
+            "upstream_requests": upstream,
+        },
+        "results": results,
+    }
+
+
+def print_report(report, baseline=None):
+    meta = report["meta"]
+    print(f"commit {meta['commit']}  latency {meta['latency_ms']} ms  gazetteer {meta['gazetteer']}"
+          f"  ({meta['known_cities']} cities)  upstream requests {meta['upstream_requests']}")
+    print(f"{'benchmark':20s} {'ops/s':>12s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+    for name, r in report["results"].items():
+        line = f"{name:20s} {r['throughput_per_s']:12.1f} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f}"
+        old = (baseline or {}).get("results", {}).get(name)
+        if old and old["p50_ms"]:
+            line += f"   p50 {(r['p50_ms'] / old['p50_ms'] - 1) * 100:+6.1f}%  p99 {(r['p99_ms'] / old['p99_ms'] - 1) * 100:+6.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat pipeline benchmarks")
+    parser.add_argument("--rounds", type=int, default=20, help="passes over each input set")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated upstream latency")
+    parser.add_argument("--gazetteer", choices=("sample", "full"), default="sample")
+    parser.add_argument("--output", type=Path, help="result file (default: results/<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    report = run(args)
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_report(report, baseline)
+
+    output = args.output or RESULTS / f"{report['meta']['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=1))
+    print(f"saved {output}")
+
+
+if __name__ == "__main__":
+    main()
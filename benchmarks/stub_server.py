@@ -0,0 +1,137 @@
+"""Local stand-in for the Open-Meteo geocoding and forecast APIs.
+
+Serves the recorded responses in benchmarks/fixtures with a configurable
+delay, so benchmarks run offline and deterministically. Forecast dates
+are shifted so the recorded week always starts today.
+
+Standalone:  python benchmarks/stub_server.py --port 8765 --latency-ms 40
+"""
+import argparse
+import copy
+import datetime
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+def _shift_dates(value, delta):
+    if isinstance(value, str) and _ISO_DATE.match(value):
+        day = datetime.date.fromisoformat(value[:10]) + delta
+        return day.isoformat() + value[10:]
+    if isinstance(value, list):
+        return [_shift_dates(v, delta) for v in value]
+    if isinstance(value, dict):
+        return {k: _shift_dates(v, delta) for k, v in value.items()}
+    return value
+
+
+class OpenMeteoStub:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, fixtures=FIXTURES):
+        self.latency = latency
+        self.geocoding = json.loads((fixtures / "geocoding.json").read_text(encoding="utf-8"))
+        self.forecast = json.loads((fixtures / "forecast.json").read_text(encoding="utf-8"))
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def geo_url(self):
+        return f"{self.base_url}/v1/search"
+
+    @property
+    def forecast_url(self):
+        return f"{self.base_url}/v1/forecast"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def geocode(self, query):
+        result = self.geocoding.get(query.get("name", [""])[0].lower())
+        return {"results": [result], "generationtime_ms": 0.4} if result else {"generationtime_ms": 0.4}
+
+    def forecast_for(self, query):
+        start = datetime.date.fromisoformat(self.forecast["daily"]["time"][0])
+        recorded = _shift_dates(self.forecast, datetime.date.today() - start)
+        lats = query.get("latitude", ["0"])[0].split(",")
+        lons = query.get("longitude", ["0"])[0].split(",")
+        payloads = []
+        for lat, lon in zip(lats, lons):
+            payload = copy.deepcopy(recorded)
+            payload["latitude"], payload["longitude"] = float(lat), float(lon)
+            payloads.append(payload)
+        return payloads[0] if len(payloads) == 1 else payloads
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if url.path == "/v1/search":
+                    body = stub.geocode(query)
+                elif url.path == "/v1/forecast":
+                    body = stub.forecast_for(query)
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = OpenMeteoStub(args.host, args.port, args.latency_ms / 1000)
+    print(f"Open-Meteo stub on {stub.base_url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+# Build cities.gaz, the compact gazetteer read by config, from the GeoNames cities1000.txt dump.
+# config also builds it on first use when it is missing, this is the explicit offline step:
+#   python build_gazetteer.py [cities1000.txt] [cities.gaz]
+import sys
+
+from config import CITIES_SOURCE, GAZETTEER_FILE
+from Gazetteer import build_gazetteer
+
+
+def main():
+    src = sys.argv[1] if len(sys.argv) > 1 else CITIES_SOURCE
+    dst = sys.argv[2] if len(sys.argv) > 2 else GAZETTEER_FILE
+    count = build_gazetteer(src, dst)
+    print(f"Wrote {count} cities to {dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+# Regenerate keywords.json, the WordNet expansion of ChatBot.BASE_KEYWORDS.
+# Run it offline whenever BASE_KEYWORDS changes: python build_keywords.py
+from ChatBot import KEYWORDS_FILE, ChatResources, save_keywords
+
+
+def main():
+    resources = ChatResources(keywords_path=None)
+    save_keywords(resources.keywords, KEYWORDS_FILE)
+    counts = ", ".join(f"{intent}: {len(kws)}" for intent, kws in resources.keywords.items())
+    print(f"Wrote {KEYWORDS_FILE} ({counts})")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,29 +29,57 @@ WEATHER_CODE_MAP = {
     97: "Thunderstorm with heavy hail"
 }
 
-import pandas as pd
-
-import nltk
-import string
-nltk.download('wordnet')
-nltk.download('omw-1.4')
-
-def load_city_list(path="cities1000.txt"):
-    df = pd.read_csv(
-        path,
-        sep='\t',
-        header=None,
-        names=[
-            "geonameid","name","asciiname","alternatenames","latitude","longitude",
-            "feature class","feature code","country code","cc2","admin1","admin2",
-            "admin3","admin4","population","elevation","dem","timezone","modification date"
-        ],
-        low_memory=False
-    )
-    df.sort_values("population", ascending=False, inplace=True)
-    top_cities = df["name"].dropna().unique().tolist()[:1000]
-
-    french_cities = df[df["country code"] == "FR"]["name"].dropna().unique().tolist()
+import os
+import threading
+from pathlib import Path
+
+try:
+    from WeatherBot.CityIndex import CityIndex
+    from WeatherBot.CityLocator import CityLocator
+    from WeatherBot.CityResolver import CityResolver
+    from WeatherBot.Gazetteer import Gazetteer, build_gazetteer
+except ImportError:
+    from CityIndex import CityIndex
+    from CityLocator import CityLocator
+    from CityResolver import CityResolver
+    from Gazetteer import Gazetteer, build_gazetteer
+
+# Folder where config.py is located
+BASE_DIR = Path(__file__).resolve().parent
+# GeoNames dump, only read when the gazetteer has to be (re)built
+CITIES_SOURCE = BASE_DIR / "cities1000.txt"
+# Compact binary gazetteer built from it, see build_gazetteer.py
+GAZETTEER_FILE = BASE_DIR / "cities.gaz"
+# SQLite file shared by all workers for geocoding results and forecasts, disabled when unset
+WEATHER_STORE_PATH = os.environ.get("WEATHERBOT_STORE")
+# How WeatherAPI reaches Open-Meteo: live (default), record:<archive.jsonl.gz> or replay:<archive.jsonl.gz>
+WEATHER_TRANSPORT = os.environ.get("WEATHERBOT_TRANSPORT")
+# Seconds past expiry a forecast is still answered with while it is refreshed in the background
+FORECAST_STALE_TTL = float(os.environ.get("WEATHERBOT_STALE_TTL", 1800))
+# Number of most asked about cities whose forecasts are refreshed before they expire, 0 disables
+PREFETCH_TOP = int(os.environ.get("WEATHERBOT_PREFETCH_TOP", 20))
+
+
+def load_gazetteer(path=GAZETTEER_FILE, source=CITIES_SOURCE):
+    # rebuilt when the format changed or cities1000.txt was updated since
+    if not Gazetteer.is_current(path, source):
+        build_gazetteer(source, path)
+    return Gazetteer(path)
+
+
+def load_city_list(gazetteer):
+    # records are already sorted by population
+    seen = set()
+    top_cities = []
+    french_cities = []
+    for i in range(len(gazetteer)):
+        name = gazetteer.name(i)
+        if len(top_cities) < 1000 and name not in seen:
+            top_cities.append(name)
+            seen.add(name)
+        elif gazetteer.country(i) == "FR" and name not in seen:
+            french_cities.append(name)
+            seen.add(name)
 
     joined = [*top_cities, *french_cities]
 
@@ -61,10 +89,35 @@ def load_city_list(path="cities1000.txt"):
     if "New York" not in filtered:
         filtered.append("New York")
 
-    return list(filtered)
+    return filtered
 
-from pathlib import Path
 
-# Folder where config.py is located
-BASE_DIR = Path(__file__).resolve().parent
-KNOWN_CITIES = load_city_list(BASE_DIR / "cities1000.txt")
+# GAZETTEER, KNOWN_CITIES, CITY_RECORDS, CITY_INDEX, CITY_RESOLVER and CITY_LOCATOR are built on first access, not at import time
+_LAZY = {
+    "GAZETTEER": lambda: load_gazetteer(),
+    "KNOWN_CITIES": lambda: load_city_list(__getattr__("GAZETTEER")),
+    # gazetteer record of each known city, the names geocoded without the API
+    "CITY_RECORDS": lambda: __getattr__("GAZETTEER").name_index(__getattr__("KNOWN_CITIES")),
+    # KNOWN_CITIES is sorted by population, so list position doubles as the tie-break rank
+    "CITY_INDEX": lambda: CityIndex(__getattr__("KNOWN_CITIES")),
+    # typo tolerant lookup over the same cities, only used when CITY_INDEX finds nothing
+    "CITY_RESOLVER": lambda: CityResolver(__getattr__("KNOWN_CITIES")),
+    # nearest city to a position, over every record of the gazetteer
+    "CITY_LOCATOR": lambda: CityLocator(__getattr__("GAZETTEER")),
+}
+_lazy_lock = threading.RLock()
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _lazy_lock:
+        if name not in globals():
+            globals()[name] = _LAZY[name]()
+    return globals()[name]
+
+
+# Build lazy attributes now instead of on first access, e.g. before serving or forking
+def preload(*names):
+    for name in names:
+        __getattr__(name)
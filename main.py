@@ -4,6 +4,7 @@ import sys
 from pathlib import Path
 
 from ChatBot import Chatbot
+from Metrics import METRICS
 
 
 def initialize_session_state():
@@ -22,6 +23,32 @@ def display_chat_history():
             st.markdown(message["content"])
 
 
+def display_debug_panel():
+    """Show the stage timings of the last answer (only when WEATHERBOT_METRICS=1)"""
+    if not METRICS.enabled:
+        return
+    timings = st.session_state.chatbot.last_timings
+    with st.expander("⏱️ Last request timings", expanded=False):
+        if not timings:
+            st.caption("No request yet.")
+            return
+        st.table({
+            "stage": list(timings),
+            "ms": [round(seconds * 1000, 2) for seconds in timings.values()],
+        })
+        st.download_button("Download metrics (JSON)", METRICS.to_json(), file_name="weatherbot_metrics.json")
+
+
+def location_input():
+    """Optional position of the user, for questions like 'what's the weather here?'"""
+    with st.expander("📍 My location", expanded=False):
+        share = st.checkbox("Use my location when no city is named", key="share_location")
+        col_lat, col_lon = st.columns(2)
+        lat = col_lat.number_input("Latitude", min_value=-90.0, max_value=90.0, value=48.8566, format="%.4f")
+        lon = col_lon.number_input("Longitude", min_value=-180.0, max_value=180.0, value=2.3522, format="%.4f")
+    return (lat, lon) if share else None
+
+
 def main():
     # Page configuration
     st.set_page_config(
@@ -53,6 +80,7 @@ def main():
         - *"Is it going to rain in Berlin today?"*
         - *"What's the temperature in London?"*
         - *"How windy is it in Chicago tomorrow?"*
+        - *"What's the weather here?"* (with 📍 My location turned on)
         
         ### 💬 Other Commands:
         
@@ -80,6 +108,11 @@ def main():
     
     # Display chat history
     display_chat_history()
+
+    # Timing breakdown of the last answer
+    display_debug_panel()
+
+    coords = location_input()
     
     # Chat input
     if prompt := st.chat_input("Ask me about the weather..."):
@@ -94,7 +127,7 @@ def main():
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
                 try:
-                    response, intent = st.session_state.chatbot.chat(prompt)
+                    response, intent = st.session_state.chatbot.chat(prompt, coords=coords)
                 except Exception as e:
                     response = f"Oops! Something went wrong: {str(e)}"
                     intent = "error"
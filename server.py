@@ -0,0 +1,319 @@
+# Headless JSON API for the chatbot, an alternative to the Streamlit UI in main.py.
+#
+#   python server.py --port 8080 --workers 4 --threads 16
+#
+#   POST /chat        {"message": "weather in Paris tomorrow", "session": "abc"}
+#   POST /chat/batch  {"messages": ["hi", "rain in Lyon today"], "session": "abc"}
+#   GET  /healthz
+#   GET  /metrics     (Prometheus text, ?format=json for JSON; per worker process)
+#
+# Each worker process owns a bounded thread pool for chat work. Requests that
+# would push the pool past --max-pending are refused with 503 + Retry-After,
+# and requests that take longer than --timeout get a 504 (the work still
+# finishes and warms the caches).
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from ChatBot import Chatbot, ChatResources
+from Metrics import METRICS
+
+MAX_BODY = 64 * 1024
+
+
+class Overloaded(Exception):
+    pass
+
+
+class ChatService:
+    """Chat sessions and the bounded pool that answers them.
+
+    Sessions are Chatbot instances over one shared ChatResources, kept in an
+    LRU of `max_sessions` and dropped after `session_ttl` seconds idle.
+    Messages of one session run one at a time so follow-ups see the
+    previous answer.
+    """
+
+    def __init__(self, resources=None, threads=16, max_pending=64, timeout=10.0,
+                 max_sessions=10000, session_ttl=1800, max_batch=50):
+        self.resources = resources or ChatResources.shared()
+        self.threads = threads
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.max_batch = max_batch
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    # The pool is created lazily so that it is never inherited across a fork
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix="chat")
+        return self._executor
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def session(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or now - entry[2] > self.session_ttl:
+                entry = (Chatbot(self.resources), threading.Lock(), now)
+            else:
+                entry = (entry[0], entry[1], now)
+            self._sessions[session_id] = entry
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return entry[0], entry[1]
+
+    def _reply(self, messages, session_id):
+        if session_id is None:
+            return [self._answer(Chatbot(self.resources), message) for message in messages]
+        bot, lock = self.session(session_id)
+        with lock:
+            return [self._answer(bot, message) for message in messages]
+
+    @staticmethod
+    def _answer(bot, message):
+        response, intent = bot.chat(message)
+        return {"response": response, "intent": intent}
+
+    # Take `cost` slots of the pending budget, or refuse the request
+    def _acquire(self, cost):
+        taken = 0
+        while taken < cost and self._slots.acquire(blocking=False):
+            taken += 1
+        if taken < cost:
+            for _ in range(taken):
+                self._slots.release()
+            METRICS.inc("server_rejected_total")
+            raise Overloaded()
+        with self._lock:
+            self._pending += cost
+
+    # Run fn in the pool; its `cost` slots are given back when it is done, even after a timeout
+    def _submit(self, cost, fn, *args):
+        def release(_):
+            with self._lock:
+                self._pending -= cost
+            for _ in range(cost):
+                self._slots.release()
+
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(release)
+        return future
+
+    # Answer one message; raises Overloaded or concurrent.futures.TimeoutError
+    def chat(self, message, session_id=None):
+        self._acquire(1)
+        return self._submit(1, self._reply, [message], session_id).result(timeout=self.timeout)[0]
+
+    # Answer several messages: in order within a session, in parallel otherwise
+    def chat_batch(self, messages, session_id=None):
+        if not messages:
+            return []
+        self._acquire(len(messages))
+        if session_id is not None:
+            return self._submit(len(messages), self._reply, messages, session_id).result(timeout=self.timeout)
+        deadline = time.monotonic() + self.timeout
+        futures = [self._submit(1, self._reply, [message], None) for message in messages]
+        return [f.result(timeout=max(0.0, deadline - time.monotonic()))[0] for f in futures]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "WeatherBot/1.0"
+    # seconds a client may stay silent before its connection is closed
+    timeout = 30
+    # headers and body go out in separate writes, Nagle would hold the body back for an ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_text(status, body, "application/json; charset=utf-8", headers)
+
+    def send_text(self, status, body, content_type, headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        METRICS.inc("server_responses_total", status=status)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            raise ValueError("request body too large")
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise ValueError("request body is not valid JSON")
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        service = self.server.service
+        if url.path == "/healthz":
+            self.send_json(200, {"status": "ok", "pid": os.getpid(), "pending": service.pending})
+        elif url.path == "/metrics":
+            if parse_qs(url.query).get("format") == ["json"]:
+                self.send_text(200, METRICS.to_json(), "application/json")
+            else:
+                self.send_text(200, METRICS.to_prometheus(), "text/plain; version=0.0.4")
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path not in ("/chat", "/chat/batch"):
+            self.send_json(404, {"error": "not found"})
+            return
+        service = self.server.service
+        try:
+            with METRICS.span("server_" + path.strip("/").replace("/", "_")):
+                body = self.read_json()
+                if not isinstance(body, dict):
+                    raise ValueError("request body must be a JSON object")
+                session_id = body.get("session")
+                if session_id is not None and not isinstance(session_id, str):
+                    raise ValueError("'session' must be a string")
+
+                if path == "/chat":
+                    message = body.get("message")
+                    if not isinstance(message, str) or not message.strip():
+                        raise ValueError("'message' must be a non empty string")
+                    result = service.chat(message, session_id)
+                else:
+                    messages = body.get("messages")
+                    if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+                        raise ValueError("'messages' must be a list of strings")
+                    if len(messages) > service.max_batch:
+                        raise ValueError(f"at most {service.max_batch} messages per batch")
+                    result = {"results": service.chat_batch(messages, session_id)}
+        except ValueError as e:
+            # the body may be partly unread, so this connection cannot be reused
+            self.close_connection = True
+            self.send_json(400, {"error": str(e)})
+            return
+        except Overloaded:
+            self.send_json(503, {"error": "server busy, retry later"}, {"Retry-After": "1"})
+            return
+        except FutureTimeout:
+            self.send_json(504, {"error": "request timed out"})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": type(e).__name__})
+            return
+
+        if session_id is not None:
+            result["session"] = session_id
+        self.send_json(200, result)
+
+
+class ChatServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, address, service, verbose=False, bind_and_activate=True):
+        self.service = service
+        self.verbose = verbose
+        super().__init__(address, ChatRequestHandler, bind_and_activate)
+
+
+# Fork `workers` processes that accept on the already bound socket of `server`
+def prefork(server, workers):
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+            try:
+                server.serve_forever()
+            finally:
+                server.service.shutdown()
+                os._exit(0)
+        children.append(pid)
+
+    def stop(*_):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WeatherBot HTTP/JSON chat service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=1, help="pre-forked worker processes")
+    parser.add_argument("--threads", type=int, default=16, help="chat threads per worker")
+    parser.add_argument("--max-pending", type=int, default=64, help="queued + running messages per worker before 503")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds before a request gets a 504")
+    parser.add_argument("--max-batch", type=int, default=50)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    # built before forking, so the workers share keywords, city index and spell engine pages,
+    # and the city tables that are otherwise built by the first request that needs them
+    resources = ChatResources.shared()
+    resources.preload()
+    service = ChatService(resources, threads=args.threads, max_pending=args.max_pending,
+                          timeout=args.timeout, max_batch=args.max_batch)
+    server = ChatServer((args.host, args.port), service, verbose=args.verbose)
+    print(f"WeatherBot API on http://{args.host}:{server.server_address[1]} "
+          f"({args.workers} worker(s) x {args.threads} threads)")
+
+    if args.workers > 1 and hasattr(os, "fork"):
+        prefork(server, args.workers)
+    else:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()